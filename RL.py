@@ -1,21 +1,24 @@
 import numpy as np
 import random
-from collections import defaultdict
+import rules
+from bitboard import as_state, MOVE_TO_INDEX
+from qtable import QTable, QSnapshot
 
 class UltimateTicTacToeRL:
-    def __init__(self, alpha=0.1, gamma=0.9, epsilon=0.1):
+    def __init__(self, alpha=0.1, gamma=0.9, epsilon=0.1, max_states=1_000_000, dtype=np.float32):
         # Learning rate
         self.alpha = alpha
         # Discount factor
         self.gamma = gamma
         # Exploration rate
         self.epsilon = epsilon
-        # Q table
-        self.q_table = defaultdict(lambda: np.zeros(81))
-        # State history for the episode
+        # Q table, keeping at most max_states states; actions are move
+        # indexes board * 9 + cell, as train.py and pipeline.py store them
+        self.q_table = QTable(max_states, dtype)
+        # State history for the episode, as (state, active_box, action)
         self.state_history = []
 
-    def choose_action(self, state, valid_actions):
+    def choose_action(self, state, valid_actions, active_box=None):
         """
         Epsilon selection
         """
@@ -23,27 +26,53 @@ class UltimateTicTacToeRL:
             # Exploration: choose a random valid action
             return random.choice(valid_actions)
         else:
-            state_key = self.state_to_key(state)
-            q_values = self.q_table[state_key]
-            valid_q_values = [(action, q_values[action[0] * 9 + action[1]]) for action in valid_actions]
-            return max(valid_q_values, key=lambda x: x[1])[0]
+            state_key = self.state_to_key(state, active_box)
+            q_values = self.q_table.get_many(state_key, [MOVE_TO_INDEX[action] for action in valid_actions])
+            return valid_actions[int(np.argmax(q_values))]
+
+    def state_to_key(self, state, active_box=None):
+        """
+        Returns the integer key of a state, a BitState or a 9x9 board with
+        X to move.
+        """
+        return as_state(state, active_box).key
+
+    def save(self, path):
+        """
+        Writes the Q-table as a snapshot file.
+        """
+        self.q_table.save(path)
+
+    def load(self, path, read_only=False):
+        """
+        Loads the Q-table from a snapshot file to resume training.
+
+        With read_only the snapshot is mapped in place instead of copied,
+        for playing only: it starts at once and its pages are shared by
+        every process reading the file, but update_q_table cannot write it.
+        """
+        snapshot = QSnapshot(path)
+        if read_only:
+            self.q_table = snapshot
+        else:
+            self.q_table = QTable.from_snapshot(snapshot, max(len(snapshot), self.q_table.max_entries))
+            snapshot.close()
 
     def update_q_table(self, reward):
         """Update Q-table based on the episode's history."""
+        state_keys = [self.state_to_key(state, active_box) for state, active_box, _ in self.state_history]
         for i in reversed(range(len(self.state_history) - 1)):
-            state, action = self.state_history[i]
-            next_state, _ = self.state_history[i + 1]
+            _, _, action = self.state_history[i]
+            state_key = state_keys[i]
+            next_state_key = state_keys[i + 1]
 
-            state_key = self.state_to_key(state)
-            next_state_key = self.state_to_key(next_state)
-
-            action_index = action[0] * 9 + action[1]
-            best_next_action = max(self.q_table[next_state_key])
+            action_index = MOVE_TO_INDEX[action]
+            best_next_action = self.q_table.max_value(next_state_key)
 
             # Update Q-value using Bellman equation
-            self.q_table[state_key][action_index] += self.alpha * (
-                reward + self.gamma * best_next_action - self.q_table[state_key][action_index]
-            )
+            self.q_table.add(state_key, action_index, self.alpha * (
+                reward + self.gamma * best_next_action - self.q_table.get(state_key, action_index)
+            ))
 
             # Set reward to 0 after the first step (reward is already added)
             reward = 0
@@ -53,17 +82,22 @@ class UltimateTicTacToeRL:
         """
         Returns all available moves as tuples within the active box.
         """
-        if active_box is not None:
-            box_row, box_col = active_box
-            valid_moves = [
-                (box_row * 3 + i, box_col * 3 + j)
-                for i in range(3) for j in range(3)
-                if game_state[box_row * 3 + i][box_col * 3 + j] == ' '
-            ]
-            if valid_moves:
-                return valid_moves
-        return [(i, j) for i in range(9) for j in range(9) if game_state[i][j] == ' ']
-    
-    def play(self, big_board, player, state):
-       pass
-       #unimplemented, not sure if we have time for this
\ No newline at end of file
+        return rules.get_valid_moves(game_state, active_box)
+
+    def apply_move(self, game_state, move, player):
+        """
+        Applies a move to the board.
+        """
+        return rules.apply_move(game_state, move, player)
+
+    def check_winner(self, game_state):
+        """
+        Checks for a winner in any small board of the big board.
+        """
+        return rules.check_winner(game_state)
+
+    def check_small_board(self, board):
+        """
+        Checks for a winner in a small board.
+        """
+        return rules.check_small_board(board)
@@ -0,0 +1,93 @@
+"""
+NumPy batch playouts: many random games stepped together.
+
+Games are held as an (N, 2, 9) array of 9-bit masks, the same layout as
+BitState.masks, so legal moves and small board wins are table lookups on
+whole columns of games. Each step plays one random legal move in every
+unfinished game, and finished games are retired from the batch.
+"""
+import numpy as np
+from bitboard import BITS, FULL, IS_WIN, PLAYERS
+
+# Lookup tables indexed by a 9-bit mask
+WIN_TABLE = np.array(IS_WIN, dtype=bool)
+POPCOUNT = np.array([len(bits) for bits in BITS], dtype=np.int64)
+NTH_BIT = np.array([bits + (0,) * (9 - len(bits)) for bits in BITS], dtype=np.int64)
+
+# Draw results in the array returned by batch_playouts
+DRAW = -1
+
+
+def batch_playouts(state, count, rng=None):
+    """
+    Plays count random games from a BitState under the full rules.
+
+    Returns an int8 array with the index of the winner of each game, or DRAW.
+    rng is a numpy Generator or a seed.
+    """
+    rng = np.random.default_rng(rng)
+    results = np.full(count, DRAW, dtype=np.int8)
+    for index in range(2):
+        if IS_WIN[state.macro[index]]:
+            results[:] = index
+            return results
+    if state.closed == FULL:
+        return results
+
+    masks = np.empty((count, 2, 9), dtype=np.int64)
+    masks[:] = state.masks
+    macro = np.empty((count, 2), dtype=np.int64)
+    macro[:] = state.macro
+    closed = np.full(count, state.closed, dtype=np.int64)
+    active = np.full(count, -1 if state.active is None else state.active, dtype=np.int64)
+    player = np.full(count, state.player, dtype=np.int64)
+    live = np.arange(count)
+    board_bits = 1 << np.arange(9)
+
+    while live.size:
+        rows = np.arange(live.size)
+        empty = FULL & ~(masks[:, 0] | masks[:, 1])
+        board = active.copy()
+
+        # Games with a free choice pick a board weighted by its empty cells
+        free = np.flatnonzero(active < 0)
+        if free.size:
+            sizes = POPCOUNT[empty[free]] * ((closed[free, None] & board_bits) == 0)
+            totals = np.cumsum(sizes, axis=1)
+            pick = (rng.random(free.size) * totals[:, -1]).astype(np.int64)
+            board[free] = (totals <= pick[:, None]).sum(axis=1)
+
+        # Then a uniform empty cell of the board
+        board_empty = empty[rows, board]
+        nth = (rng.random(live.size) * POPCOUNT[board_empty]).astype(np.int64)
+        cell = NTH_BIT[board_empty, nth]
+        bit = np.int64(1) << cell
+        own = masks[rows, player, board] | bit
+        masks[rows, player, board] = own
+
+        won = WIN_TABLE[own]
+        full = (own | masks[rows, 1 - player, board]) == FULL
+        board_bit = np.int64(1) << board
+        macro[rows, player] |= np.where(won, board_bit, 0)
+        closed |= np.where(won | full, board_bit, 0)
+
+        # Retire finished games
+        game_won = won & WIN_TABLE[macro[rows, player]]
+        results[live[game_won]] = player[game_won]
+        keep = ~game_won & (closed != FULL)
+
+        live = live[keep]
+        masks = masks[keep]
+        macro = macro[keep]
+        closed = closed[keep]
+        active = np.where((closed >> cell[keep]) & 1, -1, cell[keep])
+        player = 1 - player[keep]
+    return results
+
+
+def count_results(results):
+    """
+    Returns a dict of game counts keyed by 'X', 'O' and None for draws.
+    """
+    counts = np.bincount(results + 1, minlength=3)
+    return {None: int(counts[0]), PLAYERS[0]: int(counts[1]), PLAYERS[1]: int(counts[2])}
@@ -0,0 +1,243 @@
+"""
+Benchmark suite for the game engines.
+
+Every measurement runs over a fixed corpus of positions, so results of
+different commits can be compared as long as CORPUS_VERSION is the same.
+Change the version whenever a position of the corpus changes.
+
+Run this module to print the results as JSON, or to write them to a file:
+
+    python benchmark.py --output results.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from bitboard import BitState, MOVE_TO_INDEX
+from minimax import UltimateTicTacToeAI
+from monte import MonteCarloAI
+from rollout import playout
+
+CORPUS_VERSION = 2
+
+# Positions as the moves played from the empty board, X first. Every
+# position has X to move and no won small board, since minimax ends its
+# search at any won small board, and free-choice is searched with
+# active_box None instead of its target box. late-game has 37 empty cells.
+CORPUS = (
+    {
+        'name': 'opening',
+        'moves': [(2, 5), (6, 7), (1, 4), (3, 4)],
+    },
+    {
+        'name': 'middlegame',
+        'moves': [(6, 2), (2, 7), (8, 5), (7, 6), (4, 2), (4, 6), (4, 0), (5, 2), (8, 8), (6, 8),
+                  (0, 6), (2, 0), (6, 1), (0, 5), (2, 6), (8, 1), (7, 4), (3, 4), (2, 3), (8, 2)],
+    },
+    {
+        'name': 'free-choice',
+        'moves': [(1, 0), (5, 0), (8, 0), (6, 0), (2, 2), (7, 7), (4, 3), (3, 1), (1, 5), (3, 6),
+                  (0, 0), (0, 1), (0, 3), (2, 0), (8, 1), (7, 3)],
+        'free_choice': True,
+    },
+    {
+        'name': 'late-game',
+        'moves': [(1, 2), (5, 8), (6, 7), (2, 3), (8, 1), (7, 3), (3, 1), (0, 3), (2, 0), (6, 1),
+                  (0, 5), (1, 7), (3, 5), (0, 8), (0, 7), (0, 4), (2, 4), (6, 5), (2, 6), (6, 0),
+                  (0, 2), (1, 6), (5, 2), (6, 8), (2, 8), (7, 6), (4, 1), (3, 4), (1, 3), (3, 2),
+                  (0, 6), (2, 2), (8, 6), (8, 2), (8, 8), (6, 6), (2, 1), (8, 3), (6, 2), (2, 7),
+                  (7, 4), (4, 4), (5, 4), (7, 5)],
+    },
+)
+
+# Settings of the full run and of the --quick run
+SETTINGS = {
+    'full': {'minimax_depth': 6, 'rollouts': 2000, 'repeat': 5, 'latency_depth': 4, 'iterations': 1000},
+    'quick': {'minimax_depth': 2, 'rollouts': 200, 'repeat': 2, 'latency_depth': 2, 'iterations': 100},
+}
+
+# Code timed in a fresh interpreter by measure_startup: the bare
+# interpreter, the engines alone, main.py up to its first prompt, and the GUI
+STARTUP = {
+    'interpreter': 'pass',
+    'engines': 'import minimax, monte',
+    'main': 'import main',
+    'gui': 'import gui',
+}
+
+
+def load_position(entry):
+    """
+    Returns the grid and active box of a corpus entry, as get_best_move takes them.
+    """
+    state = BitState()
+    for move in entry['moves']:
+        state.play(MOVE_TO_INDEX[move])
+    active_box = None
+    if state.active is not None and not entry.get('free_choice'):
+        active_box = divmod(state.active, 3)
+    return state.to_grid(), active_box
+
+
+def percentile(samples, fraction):
+    """
+    Returns the nearest-rank percentile of samples, for fraction in (0, 1].
+    """
+    ordered = sorted(samples)
+    rank = max(math.ceil(fraction * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def measure_nodes(positions, depth):
+    """
+    Returns minimax nodes per second over fixed-depth searches of positions.
+    """
+    nodes = 0
+    elapsed = 0.0
+    for grid, active_box in positions:
+        ai = UltimateTicTacToeAI(max_depth=depth)
+        start = time.perf_counter()
+        ai.get_best_move(grid, active_box)
+        elapsed += time.perf_counter() - start
+        nodes += ai.nodes
+    return {'nodes': nodes, 'seconds': elapsed, 'nodes_per_sec': nodes / elapsed}
+
+
+def measure_rollouts(positions, rollouts, seed=0):
+    """
+    Returns random playouts per second from positions.
+    """
+    rng = random.Random(seed)
+    states = [BitState.from_grid(grid, active_box) for grid, active_box in positions]
+    start = time.perf_counter()
+    for state in states:
+        for _ in range(rollouts):
+            playout(state, rng)
+    elapsed = time.perf_counter() - start
+    total = rollouts * len(states)
+    return {'rollouts': total, 'seconds': elapsed, 'rollouts_per_sec': total / elapsed}
+
+
+def measure_engine(engine, positions, repeat):
+    """
+    Returns get_best_move latency percentiles and peak traced memory.
+
+    The engine starts a new game before every call, so no search reuses the
+    result of an earlier one. Memory is traced in a separate pass because
+    tracing slows the engine down.
+    """
+    samples = []
+    for _ in range(repeat):
+        for grid, active_box in positions:
+            engine.new_game()
+            start = time.perf_counter()
+            engine.get_best_move(grid, active_box)
+            samples.append(time.perf_counter() - start)
+
+    peak = 0
+    for grid, active_box in positions:
+        engine.new_game()
+        tracemalloc.start()
+        engine.get_best_move(grid, active_box)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return {
+        'calls': len(samples),
+        'p50': percentile(samples, 0.50),
+        'p95': percentile(samples, 0.95),
+        'p99': percentile(samples, 0.99),
+        'peak_memory_bytes': peak,
+    }
+
+
+def measure_startup(repeat):
+    """
+    Returns the p50 and minimum milliseconds of running each STARTUP entry
+    in a new interpreter, and whether it loaded pygame.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, SDL_VIDEODRIVER='dummy', PYGAME_HIDE_SUPPORT_PROMPT='1')
+    results = {}
+    for name, code in STARTUP.items():
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            process = subprocess.run(
+                [sys.executable, '-c', code + "\nimport sys; print('pygame' in sys.modules)"],
+                cwd=directory, env=env, capture_output=True, text=True, check=True)
+            samples.append(time.perf_counter() - start)
+        results[name] = {
+            'p50_ms': percentile(samples, 0.50) * 1000,
+            'min_ms': min(samples) * 1000,
+            'loads_pygame': process.stdout.split()[-1] == 'True',
+        }
+    return results
+
+
+def git_commit():
+    """
+    Returns the commit hash of the working tree, or None outside a git checkout.
+    """
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def run_benchmarks(quick=False, repeat=None):
+    """
+    Runs every benchmark on the corpus and returns the results as a dict.
+    """
+    settings = dict(SETTINGS['quick' if quick else 'full'])
+    if repeat is not None:
+        settings['repeat'] = repeat
+    positions = [load_position(entry) for entry in CORPUS]
+    engines = {
+        'minimax': UltimateTicTacToeAI(max_depth=settings['latency_depth']),
+        'monte_carlo': MonteCarloAI(iterations=settings['iterations'], seed=0),
+    }
+    return {
+        'corpus_version': CORPUS_VERSION,
+        'positions': [entry['name'] for entry in CORPUS],
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'settings': settings,
+        'minimax': measure_nodes(positions, settings['minimax_depth']),
+        'rollouts': measure_rollouts(positions, settings['rollouts']),
+        'latency': {name: measure_engine(engine, positions, settings['repeat'])
+                    for name, engine in engines.items()},
+        'startup': measure_startup(settings['repeat']),
+    }
+
+
+def main(argv=None):
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', help='write the JSON results to this file')
+    parser.add_argument('--quick', action='store_true', help='shallow searches and few samples')
+    parser.add_argument('--repeat', type=int, help='get_best_move calls per position')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.quick, args.repeat)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,274 @@
+"""
+Compact bitboard state for ultimate tic-tac-toe.
+
+Each small board is stored as one 9-bit mask per player, where bit r * 3 + c
+is cell (r, c) of that small board. Small boards are numbered
+box_row * 3 + box_col, and a move is the single index board * 9 + cell.
+"""
+import random
+from functools import reduce
+from lookup import BITS, FULL, IS_WIN, OPEN_ROWS, TERNARY, WIN_MASKS
+
+PLAYERS = ('X', 'O')
+POWERS = tuple(3 ** cell for cell in range(9))
+
+# Conversions between move indexes and (row, col) on the 9x9 grid
+INDEX_TO_MOVE = tuple(
+    ((board // 3) * 3 + cell // 3, (board % 3) * 3 + cell % 3)
+    for board in range(9) for cell in range(9)
+)
+MOVE_TO_INDEX = {move: index for index, move in enumerate(INDEX_TO_MOVE)}
+
+# BOARD_MOVES[board][empty_mask] is the tuple of move indexes of the empty
+# cells of a small board
+BOARD_MOVES = tuple(
+    tuple(tuple(board * 9 + cell for cell in BITS[mask]) for mask in range(512))
+    for board in range(9)
+)
+
+# Zobrist keys for (player, cell), the active box (index 9 for a free choice)
+# and O to move, drawn from a fixed seed so keys are stable between runs
+_zobrist_random = random.Random(0x5eed)
+ZOBRIST_CELLS = tuple(tuple(_zobrist_random.getrandbits(64) for _ in range(81)) for _ in PLAYERS)
+ZOBRIST_ACTIVE = tuple(_zobrist_random.getrandbits(64) for _ in range(10))
+ZOBRIST_SIDE = _zobrist_random.getrandbits(64)
+
+# Signature of the Zobrist tables, stored in files keyed by Zobrist key
+ZOBRIST_SIGNATURE = reduce(lambda a, b: (a * 31 + b) & 0xFFFFFFFFFFFFFFFF,
+                           ZOBRIST_CELLS[0] + ZOBRIST_CELLS[1] + ZOBRIST_ACTIVE + (ZOBRIST_SIDE,))
+
+
+class BitState:
+    """
+    Game state as bit masks.
+
+    masks[p][b] holds the cells of player p in small board b, boards[b] the
+    lookup.py table index of small board b, macro[p] the small boards won by
+    player p, and closed the boards that are won or full.
+    active is the board the next move must be played in, or None for a free
+    choice, and player is the index of the side to move. key is the Zobrist
+    hash of the position, and history is the undo stack of
+    (move, closed, active, key) entries pushed by play.
+
+    rows[p][b] caches the number of rows of small board b where player p has
+    a mark and an empty cell (zero once the board is won), and open_rows[p]
+    their sum, so the minimax heuristic never rescans the board. moves[b]
+    caches the legal moves of small board b (empty once it is closed); a
+    move only changes the entry of the board it was played in.
+    """
+    __slots__ = ('masks', 'boards', 'macro', 'closed', 'active', 'player', 'key', 'history',
+                 'rows', 'open_rows', 'moves')
+
+    def __init__(self):
+        """
+        Initialize an empty position with X to move
+        """
+        self.masks = ([0] * 9, [0] * 9)
+        self.boards = [0] * 9
+        self.macro = [0, 0]
+        self.closed = 0
+        self.active = None
+        self.player = 0
+        self.key = ZOBRIST_ACTIVE[9]
+        self.history = []
+        self.rows = ([0] * 9, [0] * 9)
+        self.open_rows = [0, 0]
+        self.moves = [BOARD_MOVES[board][FULL] for board in range(9)]
+
+    @classmethod
+    def from_grid(cls, game_state, active_box=None, player='X'):
+        """
+        Builds a state from a 9x9 list of ' ', 'X' and 'O'.
+        """
+        state = cls()
+        for index, (row, col) in enumerate(INDEX_TO_MOVE):
+            cell = game_state[row][col]
+            if cell != ' ':
+                state.masks[PLAYERS.index(cell)][index // 9] |= 1 << index % 9
+        for board in range(9):
+            state._update_board(board)
+        if active_box is not None:
+            board = active_box[0] * 3 + active_box[1]
+            if not state.closed >> board & 1:
+                state.active = board
+        state.player = PLAYERS.index(player)
+        state.key = state.compute_key()
+        return state
+
+    def to_grid(self):
+        """
+        Returns the position as a 9x9 list of ' ', 'X' and 'O'.
+        """
+        grid = [[' '] * 9 for _ in range(9)]
+        for index, (row, col) in enumerate(INDEX_TO_MOVE):
+            bit = 1 << index % 9
+            if self.masks[0][index // 9] & bit:
+                grid[row][col] = 'X'
+            elif self.masks[1][index // 9] & bit:
+                grid[row][col] = 'O'
+        return grid
+
+    def copy(self):
+        """
+        Returns an independent copy of the state.
+        """
+        state = BitState.__new__(BitState)
+        state.masks = (self.masks[0][:], self.masks[1][:])
+        state.boards = self.boards[:]
+        state.macro = self.macro[:]
+        state.closed = self.closed
+        state.active = self.active
+        state.player = self.player
+        state.key = self.key
+        state.history = self.history[:]
+        state.rows = (self.rows[0][:], self.rows[1][:])
+        state.open_rows = self.open_rows[:]
+        state.moves = self.moves[:]
+        return state
+
+    def compute_key(self):
+        """
+        Computes the Zobrist hash of the position from scratch.
+        """
+        key = ZOBRIST_ACTIVE[9 if self.active is None else self.active]
+        if self.player:
+            key ^= ZOBRIST_SIDE
+        for player in range(2):
+            cells = ZOBRIST_CELLS[player]
+            for board, mask in enumerate(self.masks[player]):
+                for cell in BITS[mask]:
+                    key ^= cells[board * 9 + cell]
+        return key
+
+    def _update_board(self, board):
+        """
+        Recompute the won and closed flags of one small board
+        """
+        x, o = self.masks[0][board], self.masks[1][board]
+        self.boards[board] = TERNARY[x] + 2 * TERNARY[o]
+        bit = 1 << board
+        if IS_WIN[x]:
+            self.macro[0] |= bit
+        elif IS_WIN[o]:
+            self.macro[1] |= bit
+        if self.macro[0] & bit or self.macro[1] & bit or x | o == FULL:
+            self.closed |= bit
+        self._refresh(board)
+
+    def _refresh(self, board):
+        """
+        Refresh the cached legal moves and open row counts of one small
+        board, and the row totals
+        """
+        if self.closed >> board & 1:
+            self.moves[board] = ()
+        else:
+            self.moves[board] = BOARD_MOVES[board][FULL & ~(self.masks[0][board] | self.masks[1][board])]
+        rows_x, rows_o = self.rows
+        old_x, old_o = rows_x[board], rows_o[board]
+        if (self.macro[0] | self.macro[1]) >> board & 1:
+            new_x = new_o = 0
+        else:
+            new_x, new_o = OPEN_ROWS[self.boards[board]]
+        rows_x[board] = new_x
+        rows_o[board] = new_o
+        self.open_rows[0] += new_x - old_x
+        self.open_rows[1] += new_o - old_o
+
+    def empty(self, board):
+        """
+        Returns the mask of empty cells in a small board.
+        """
+        return FULL & ~(self.masks[0][board] | self.masks[1][board])
+
+    def legal_moves(self):
+        """
+        Returns the legal move indexes in board-major order.
+        """
+        if self.active is not None:
+            return list(self.moves[self.active])
+        moves = []
+        for board_moves in self.moves:
+            moves += board_moves
+        return moves
+
+    def play(self, index):
+        """
+        Plays a move for the side to move and passes the turn.
+        """
+        board, cell = divmod(index, 9)
+        player = self.player
+        self.history.append((index, self.closed, self.active, self.key))
+        mask = self.masks[player][board] | 1 << cell
+        self.masks[player][board] = mask
+        self.boards[board] += (player + 1) * POWERS[cell]
+        if IS_WIN[mask]:
+            self.macro[player] |= 1 << board
+            self.closed |= 1 << board
+        elif mask | self.masks[1 - player][board] == FULL:
+            self.closed |= 1 << board
+        active = None if self.closed >> cell & 1 else cell
+        self.key ^= (ZOBRIST_CELLS[player][index] ^ ZOBRIST_SIDE
+                     ^ ZOBRIST_ACTIVE[9 if self.active is None else self.active]
+                     ^ ZOBRIST_ACTIVE[9 if active is None else active])
+        self.active = active
+        self.player = 1 - player
+        self._refresh(board)
+
+    def undo(self):
+        """
+        Takes back the last move played, restoring the small board winners
+        and the active box.
+        """
+        index, closed, self.active, self.key = self.history.pop()
+        board, cell = divmod(index, 9)
+        player = 1 - self.player
+        self.masks[player][board] &= ~(1 << cell)
+        self.boards[board] -= (player + 1) * POWERS[cell]
+        if not closed >> board & 1:
+            self.macro[player] &= ~(1 << board)
+        self.closed = closed
+        self.player = player
+        self._refresh(board)
+
+    def board_winner(self, board):
+        """
+        Returns the winner of a small board, if any.
+        """
+        if self.macro[0] >> board & 1:
+            return 'X'
+        if self.macro[1] >> board & 1:
+            return 'O'
+        return None
+
+    def winner(self):
+        """
+        Returns the winner of the whole game, if any.
+        """
+        if IS_WIN[self.macro[0]]:
+            return 'X'
+        if IS_WIN[self.macro[1]]:
+            return 'O'
+        return None
+
+    def is_full(self):
+        """
+        Checks if every cell of the big board is occupied.
+        """
+        masks_x, masks_o = self.masks
+        return all(masks_x[board] | masks_o[board] == FULL for board in range(9))
+
+    def is_over(self):
+        """
+        Checks if the game has been won or no small board is open.
+        """
+        return self.winner() is not None or self.closed == FULL
+
+
+def as_state(game_state, active_box=None, player='X'):
+    """
+    Returns game_state as a BitState, converting a 9x9 list if needed.
+    """
+    if isinstance(game_state, BitState):
+        return game_state
+    return BitState.from_grid(game_state, active_box, player)
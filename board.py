@@ -1,3 +1,6 @@
+from lookup import grid_index, IS_FULL, WINNER
+
+
 class SmallBoard:
     """
     Represents one of the nine the small boards in the game.
@@ -30,24 +33,16 @@ class SmallBoard:
         """
         Track the small winner
         """
-        lines = self.grid + [list(col) for col in zip(*self.grid)]  #
-        diagonals = [[self.grid[i][i] for i in range(3)],
-                     [self.grid[i][2 - i] for i in range(3)]]
-        for line in (lines + diagonals):
-            if line == ['X', 'X', 'X']:
-                self.winner = 'X'
-                return
-            elif line == ['O', 'O', 'O']:
-                self.winner = 'O'
-                return
+        winner = WINNER[grid_index(self.grid)]
+        if winner is not None:
+            self.winner = winner
 
     def check_full(self):
         """
         check if the board is full (so no one wins and its a draw)
         """
-        for row in self.grid:
-            if ' ' in row:
-                return False
+        if not IS_FULL[grid_index(self.grid)]:
+            return False
         self.is_full = True
         return True
 
@@ -72,16 +67,9 @@ class BigBoard:
         Track the game winner
         """
         status = [[self.boards[i][j].winner for j in range(3)] for i in range(3)]
-        lines = status + [list(col) for col in zip(*status)]
-        diagonals = [[status[i][i] for i in range(3)],
-                     [status[i][2 - i] for i in range(3)]]
-        for line in lines + diagonals:
-            if line == ['X', 'X', 'X']:
-                self.winner = 'X'
-                return
-            elif line == ['O', 'O', 'O']:
-                self.winner = 'O'
-                return
+        winner = WINNER[grid_index(status)]
+        if winner is not None:
+            self.winner = winner
 
     def is_full(self):
         """
@@ -0,0 +1,197 @@
+"""
+Opening book: precomputed moves for the first plies of a game.
+
+The book file is a header followed by the sorted Zobrist keys of the book
+positions as little-endian uint64 and one move index byte per key:
+
+    magic (8 bytes) | version | signature | count | keys[count] | moves[count]
+
+OpeningBook maps the file with mmap and binary searches the keys in place,
+so opening a book parses nothing but the header. Positions are stored as
+the AIs see them, with the AI to move as 'X'. The signature is taken from
+the Zobrist tables, so a book built with other keys is refused.
+
+Run this module to build a book from fixed-depth minimax searches:
+
+    python book.py --plies 2 --depth 5 --output opening.book
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from bitboard import BitState, MOVE_TO_INDEX, ZOBRIST_SIGNATURE
+from minimax import UltimateTicTacToeAI
+
+MAGIC = b'UTTTBOOK'
+VERSION = 1
+HEADER = struct.Struct('<8sIQI')
+KEY = struct.Struct('<Q')
+
+# Signature of the Zobrist tables the keys were computed with
+SIGNATURE = ZOBRIST_SIGNATURE
+
+# Where the AIs of main.py look for a book
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening.book')
+
+
+class OpeningBook:
+    """
+    Read-only view of a book file through mmap.
+    """
+    def __init__(self, path=DEFAULT_PATH):
+        """
+        Map the book file and check its header
+        """
+        with open(path, 'rb') as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.data) < HEADER.size:
+            self.data.close()
+            raise ValueError(f"{path} is not an opening book")
+        magic, version, signature, count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            self.data.close()
+            raise ValueError(f"{path} is not a version {VERSION} opening book")
+        if signature != SIGNATURE:
+            self.data.close()
+            raise ValueError(f"{path} was built with different Zobrist keys")
+        if len(self.data) != HEADER.size + 9 * count:
+            self.data.close()
+            raise ValueError(f"{path} is truncated")
+        self.count = count
+        self.moves_offset = HEADER.size + KEY.size * count
+
+    def probe(self, key):
+        """
+        Returns the move index stored for a Zobrist key, or None.
+        """
+        data = self.data
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if KEY.unpack_from(data, HEADER.size + KEY.size * middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and KEY.unpack_from(data, HEADER.size + KEY.size * low)[0] == key:
+            return data[self.moves_offset + low]
+        return None
+
+    def lookup(self, state):
+        """
+        Returns the book move index for a BitState if it is legal there, or None.
+        """
+        move = self.probe(state.key)
+        if move is not None and move in state.legal_moves():
+            return move
+        return None
+
+    def close(self):
+        """
+        Unmaps the file.
+        """
+        self.data.close()
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_book(path=DEFAULT_PATH):
+    """
+    Returns the OpeningBook at path, or None if there is no usable book.
+    """
+    try:
+        return OpeningBook(path)
+    except (OSError, ValueError):
+        return None
+
+
+def write_book(path, entries):
+    """
+    Writes a dict of move indexes keyed by Zobrist key as a book file.
+    """
+    keys = sorted(entries)
+    with open(path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, SIGNATURE, len(keys)))
+        file.write(struct.pack(f'<{len(keys)}Q', *keys))
+        file.write(bytes(entries[key] for key in keys))
+
+
+def swapped(state):
+    """
+    Returns the position with X and O swapped and X to move, as an AI
+    playing O sees it.
+    """
+    grid = [[{'X': 'O', 'O': 'X'}.get(cell, cell) for cell in row] for row in state.to_grid()]
+    active_box = None if state.active is None else divmod(state.active, 3)
+    return BitState.from_grid(grid, active_box, 'X')
+
+
+def book_positions(plies):
+    """
+    Returns the positions up to plies moves from the empty board, each as
+    seen by the side to move, keyed by Zobrist key.
+    """
+    positions = {}
+    frontier = [BitState()]
+    for ply in range(plies + 1):
+        following = []
+        for state in frontier:
+            view = state if state.player == 0 else swapped(state)
+            positions.setdefault(view.key, view)
+            if ply < plies and not state.is_over():
+                for move in state.legal_moves():
+                    child = state.copy()
+                    child.play(move)
+                    following.append(child)
+        frontier = following
+    return positions
+
+
+def build_book(plies=2, depth=5, progress=None):
+    """
+    Returns book entries for every position up to plies moves deep, each
+    the move of a depth-ply minimax search.
+
+    progress, if given, is called with (done, total) after every search.
+    """
+    ai = UltimateTicTacToeAI(max_depth=depth)
+    positions = book_positions(plies)
+    entries = {}
+    for done, (key, state) in enumerate(positions.items(), 1):
+        if state.legal_moves():
+            entries[key] = MOVE_TO_INDEX[ai.get_best_move(state, None)]
+        if progress is not None:
+            progress(done, len(positions))
+    return entries
+
+
+def main(argv=None):
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Build an opening book from minimax searches.")
+    parser.add_argument('--plies', type=int, default=2, help='moves from the empty board to cover')
+    parser.add_argument('--depth', type=int, default=5, help='minimax depth of every book move')
+    parser.add_argument('--output', default=DEFAULT_PATH, help='book file to write')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+
+    def progress(done, total):
+        print(f"\r{done}/{total} positions", end='', flush=True)
+
+    entries = build_book(args.plies, args.depth, progress)
+    write_book(args.output, entries)
+    print(f"\nWrote {len(entries)} positions to {args.output} in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,181 @@
+"""
+Exact endgame solver.
+
+Once few empty cells remain in the open boards, the rest of the game tree
+is small enough to search to the end under the full rules. The solver
+proves a win, loss or draw for the side to move with the number of plies to
+the end, and the AIs play its move instead of searching heuristically.
+"""
+import math
+from bitboard import as_state, BITS, FULL, IS_WIN
+from minimax import SearchTimeout
+from ordering import MoveOrderer
+from rollout import is_dead_draw
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+
+# Value of a win at the root; a win in d plies is worth WIN - d
+WIN = 1000
+
+
+class EndgameSolver:
+    """
+    Alpha-beta search to the end of the game with its own result cache.
+
+    solve is used when at most threshold empty cells are left in the open
+    boards. Searches stop after node_limit nodes, or once the cancel event
+    passed to solve is set, and the position counts as unsolved. Cached
+    results are kept between calls; call new_game to clear them.
+    """
+    def __init__(self, threshold=16, node_limit=200_000, table_size=1 << 18):
+        """
+        Initialize an empty result cache
+        """
+        self.threshold = threshold
+        self.node_limit = node_limit
+        self.table = TranspositionTable(table_size)
+        self.ordering = MoveOrderer()
+        self.nodes = 0
+        self.cancel = None
+
+    def new_game(self):
+        """
+        Forget the cached results.
+        """
+        self.table.clear()
+
+    def empty_cells(self, state):
+        """
+        Returns the number of empty cells in boards that are still open.
+        """
+        return sum(len(BITS[state.empty(board)]) for board in BITS[FULL & ~state.closed])
+
+    def applies(self, state):
+        """
+        Checks if state is small enough to solve and not over.
+        """
+        return not state.is_over() and self.empty_cells(state) <= self.threshold
+
+    def solve(self, game_state, active_box=None, player='X', cancel=None):
+        """
+        Returns (outcome, distance, move) for the side to move, or None.
+
+        outcome is 'win', 'loss' or 'draw', distance the number of plies
+        to the end of a won or lost game under best play (None for a draw),
+        and move the index of a best move: the fastest win, or the slowest
+        loss. None is returned when the position is over, too large, or not
+        solved within the node limit or before cancel, a threading.Event,
+        is set.
+        """
+        state = as_state(game_state, active_box, player).copy()
+        if not self.applies(state):
+            return None
+        self.nodes = 0
+        self.cancel = cancel
+        self.table.new_search()
+        self.ordering.new_search()
+        try:
+            value, move = self.search_root(state)
+        except SearchTimeout:
+            return None
+        if value > 0:
+            return 'win', WIN - value, move
+        if value < 0:
+            return 'loss', WIN + value, move
+        return 'draw', None, move
+
+    def best_move(self, state, cancel=None):
+        """
+        Returns the proven best move index for a BitState, or None.
+        """
+        result = self.solve(state, cancel=cancel)
+        return None if result is None else result[2]
+
+    def search_root(self, state):
+        """
+        Returns the value of state and its best move.
+        """
+        best_value = -math.inf
+        best_move = None
+        entry = self.table.probe(state.key)
+        moves = self.ordering.order(state, state.legal_moves(), entry[4] if entry else None)
+        for move in moves:
+            state.play(move)
+            value = -self.negamax(state, -math.inf, -best_value, 1)
+            state.undo()
+            if value > best_value:
+                best_value = value
+                best_move = move
+        self.table.store(state.key, 0, EXACT, best_value, best_move)
+        return best_value, best_move
+
+    def negamax(self, state, alpha, beta, ply):
+        """
+        Returns the value of state for the side to move, ply plies below
+        the root. A game won d plies below the root is worth WIN - d to the
+        winner.
+        """
+        self.nodes += 1
+        if self.nodes > self.node_limit:
+            raise SearchTimeout()
+        if not self.nodes & 255 and self.cancel is not None and self.cancel.is_set():
+            raise SearchTimeout()
+        if IS_WIN[state.macro[1 - state.player]]:
+            return ply - WIN
+        if state.closed == FULL or is_dead_draw(state.macro, state.closed):
+            return 0
+
+        alpha_orig = alpha
+        entry = self.table.probe(state.key)
+        if entry is not None:
+            # Stored values count plies from the stored position
+            value = to_search(entry[3], ply)
+            bound = entry[2]
+            if bound == EXACT or (bound == LOWER and value >= beta) or (bound == UPPER and value <= alpha):
+                return value
+
+        best_value = -math.inf
+        best_move = None
+        moves = self.ordering.order(state, state.legal_moves(), entry[4] if entry else None)
+        for move in moves:
+            state.play(move)
+            value = -self.negamax(state, -beta, -alpha, ply + 1)
+            state.undo()
+            if value > best_value:
+                best_value = value
+                best_move = move
+            if value > alpha:
+                alpha = value
+            if alpha >= beta:
+                self.ordering.record_cutoff(state, move, 1)
+                break
+
+        if best_value <= alpha_orig:
+            bound = UPPER
+        elif best_value >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.table.store(state.key, 0, bound, to_table(best_value, ply), best_move)
+        return best_value
+
+
+def to_table(value, ply):
+    """
+    Converts a value counted from the root to one counted from the node.
+    """
+    if value > 0:
+        return value + ply
+    if value < 0:
+        return value - ply
+    return value
+
+
+def to_search(value, ply):
+    """
+    Converts a value counted from the node to one counted from the root.
+    """
+    if value > 0:
+        return value - ply
+    if value < 0:
+        return value + ply
+    return value
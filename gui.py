@@ -8,35 +8,135 @@ FONT_COLOR = (0, 0, 0)
 BG_COLOR = (255, 255, 255)
 LINE_WIDTH = 5
 CELL_SIZE = SCREEN_WIDTH // 9
+SUBTITLE_HEIGHT = 50
+SUBTITLE_COLOR = (200, 200, 200)
 
-pygame.init()
-FONT = pygame.font.Font(None, 40)
+FONT_SIZE = 40
+SUBTITLE_FONT_SIZE = 30
+
+# Fonts by size, rendered 'X' and 'O' surfaces, and the empty grid, built on first use
+_fonts = {}
+_glyphs = {}
+_grid_layer = None
+
+def font(size):
+    """
+    Returns the cached default font of a size, starting the font module if
+    pygame has not been initialized yet.
+    """
+    cached = _fonts.get(size)
+    if cached is None:
+        if not pygame.font.get_init():
+            pygame.font.init()
+        cached = _fonts[size] = pygame.font.Font(None, size)
+    return cached
+
+def glyph(symbol):
+    """
+    Returns the cached surface of a cell symbol.
+    """
+    surface = _glyphs.get(symbol)
+    if surface is None:
+        surface = _glyphs[symbol] = font(FONT_SIZE).render(symbol, True, FONT_COLOR)
+    return surface
+
+def grid_layer():
+    """
+    Returns the cached surface of the empty board with its grid lines.
+    """
+    global _grid_layer
+    if _grid_layer is None:
+        layer = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        layer.fill(BG_COLOR)
+        for i in range(1, 9):
+            line_width = LINE_WIDTH if i % 3 == 0 else 2
+            pygame.draw.line(layer, GRID_COLOR, (i * CELL_SIZE, 0), (i * CELL_SIZE, SCREEN_HEIGHT), line_width)
+            pygame.draw.line(layer, GRID_COLOR, (0, i * CELL_SIZE), (SCREEN_WIDTH, i * CELL_SIZE), line_width)
+        _grid_layer = layer
+    return _grid_layer
+
+def board_cells(big_board):
+    """
+    Returns the 81 cell values of the BigBoard, row by row on the 9x9 grid.
+    """
+    return tuple(
+        big_board.boards[row // 3][col // 3].grid[row % 3][col % 3]
+        for row in range(9) for col in range(9)
+    )
+
+def draw_cell(screen, row, col, value):
+    """
+    Redraws one cell of the 9x9 grid from the cached layers and returns its
+    rectangle. The grid lines crossing the cell are restored with it.
+    """
+    rect = pygame.Rect(col * CELL_SIZE, row * CELL_SIZE, CELL_SIZE, CELL_SIZE)
+    screen.blit(grid_layer(), rect, rect)
+    if value != ' ':
+        text = glyph(value)
+        screen.blit(text, text.get_rect(center=rect.center))
+    return rect
 
 def draw_board(screen, big_board):
     """
     Draws the BigBoard and its SmallBoards on the screen.
     """
-    screen.fill(BG_COLOR)
+    screen.blit(grid_layer(), (0, 0))
+    for index, value in enumerate(board_cells(big_board)):
+        if value != ' ':
+            row, col = divmod(index, 9)
+            text = glyph(value)
+            screen.blit(text, text.get_rect(center=((col + 0.5) * CELL_SIZE, (row + 0.5) * CELL_SIZE)))
+
+def draw_subtitle(screen, subtitle):
+    """
+    Draws the subtitle bar below the board and returns its rectangle.
+    """
+    rect = pygame.Rect(0, SCREEN_HEIGHT, SCREEN_WIDTH, SUBTITLE_HEIGHT)
+    pygame.draw.rect(screen, SUBTITLE_COLOR, rect)
+    screen.blit(font(SUBTITLE_FONT_SIZE).render(subtitle, True, FONT_COLOR), (10, SCREEN_HEIGHT + 10))
+    return rect
+
+class BoardView:
+    """
+    Draws the board and subtitle, redrawing only what changed.
+
+    draw returns the dirty rectangles to pass to pygame.display.update, an
+    empty list when nothing changed. Call invalidate after anything else
+    has drawn over the screen.
+    """
+    def __init__(self, screen):
+        """
+        Initialize a view with nothing drawn yet
+        """
+        self.screen = screen
+        self.cells = None
+        self.subtitle = None
+
+    def invalidate(self):
+        """
+        Makes the next draw redraw everything.
+        """
+        self.cells = None
+        self.subtitle = None
 
-    # Draw grid lines
-    for i in range(1, 9):
-        line_width = LINE_WIDTH if i % 3 == 0 else 2
-        pygame.draw.line(screen, GRID_COLOR, (i * CELL_SIZE, 0), (i * CELL_SIZE, SCREEN_HEIGHT), line_width)
-        pygame.draw.line(screen, GRID_COLOR, (0, i * CELL_SIZE), (SCREEN_WIDTH, i * CELL_SIZE), line_width)
-
-    # Draw symbols
-    boards = big_board.boards
-    for small_row in range(3):
-        for small_col in range(3):
-            small_board = boards[small_row][small_col]
-            for cell_row in range(3):
-                for cell_col in range(3):
-                    cell_value = small_board.grid[cell_row][cell_col]
-                    if cell_value != ' ':
-                        center_x = (small_col * 3 + cell_col + 0.5) * CELL_SIZE
-                        center_y = (small_row * 3 + cell_row + 0.5) * CELL_SIZE
-                        text = FONT.render(cell_value, True, FONT_COLOR)
-                        screen.blit(text, text.get_rect(center=(center_x, center_y)))
+    def draw(self, big_board, subtitle):
+        """
+        Brings the screen up to date and returns the rectangles changed.
+        """
+        cells = board_cells(big_board)
+        rects = []
+        if self.cells is None:
+            draw_board(self.screen, big_board)
+            rects.append(pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT))
+        else:
+            for index, (old, new) in enumerate(zip(self.cells, cells)):
+                if old != new:
+                    rects.append(draw_cell(self.screen, *divmod(index, 9), new))
+        if subtitle != self.subtitle:
+            rects.append(draw_subtitle(self.screen, subtitle))
+        self.cells = cells
+        self.subtitle = subtitle
+        return rects
 
 def get_cell(pos):
     """
@@ -50,7 +150,7 @@ def show_winner(screen, winner):
     Displays the winner on the screen.
     """
     screen.fill(BG_COLOR)
-    text = FONT.render(f"Player {winner} wins!", True, FONT_COLOR)
+    text = font(FONT_SIZE).render(f"Player {winner} wins!", True, FONT_COLOR)
     screen.blit(text, text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)))
     pygame.display.flip()
     pygame.time.wait(3000)
@@ -59,7 +159,7 @@ def show_draw(screen):
     """
     Displays the winner on the screen.
     """
-    text = FONT.render("It's a draw!", True, FONT_COLOR)
+    text = font(FONT_SIZE).render("It's a draw!", True, FONT_COLOR)
     screen.blit(text, text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)))
     pygame.display.flip()
     pygame.time.wait(3000)
@@ -69,18 +169,18 @@ def starting_page(screen):
     draws the starting page choosing the algorithms
     """
     screen.fill((255, 255, 255))
-    font = pygame.font.Font(None, 50)
+    button_font = font(50)
 
     # Button 1: Minimax
     button1_rect = pygame.Rect(200, 200, 200, 50)
     pygame.draw.rect(screen, (0, 0, 255), button1_rect)
-    text1 = font.render("Minimax", True, (255, 255, 255))
+    text1 = button_font.render("Minimax", True, (255, 255, 255))
     screen.blit(text1, text1.get_rect(center=button1_rect.center))
 
     # Button 2: Monte Carlo
     button2_rect = pygame.Rect(200, 300, 200, 50)
     pygame.draw.rect(screen, (0, 255, 0), button2_rect)
-    text2 = font.render("Monte Carlo", True, (255, 255, 255))
+    text2 = button_font.render("Monte Carlo", True, (255, 255, 255))
     screen.blit(text2, text2.get_rect(center=button2_rect.center))
 
     pygame.display.flip()
@@ -0,0 +1,99 @@
+"""
+Precomputed tables for every one of the 3^9 small board positions.
+
+A small board is encoded as the base-3 number sum(v * 3 ** (r * 3 + c)),
+where v is 0 for an empty cell, 1 for X and 2 for O. From 9-bit masks the
+index is TERNARY[x_mask] + 2 * TERNARY[o_mask].
+
+Per-player tables hold an (X, O) pair for each index. The 9-bit mask tables
+used by bitboard.py live here as well.
+"""
+
+FULL = 0x1FF
+
+# The eight winning lines of a 3x3 board
+WIN_MASKS = (
+    0b000000111, 0b000111000, 0b111000000,  # rows
+    0b001001001, 0b010010010, 0b100100100,  # columns
+    0b100010001, 0b001010100,               # diagonals
+)
+
+# IS_WIN[mask] is True when the mask contains a full line
+IS_WIN = tuple(any(mask & line == line for line in WIN_MASKS) for mask in range(512))
+
+# BITS[mask] lists the set bit positions of the mask in increasing order
+BITS = tuple(tuple(i for i in range(9) if mask >> i & 1) for mask in range(512))
+
+SIZE = 3 ** 9
+
+# TERNARY[mask] is the base-3 number with a 1 digit for every set bit
+TERNARY = tuple(sum(3 ** cell for cell in BITS[mask]) for mask in range(512))
+
+# Cell values used to encode boards held as lists of strings
+CELL_VALUES = {' ': 0, 'X': 1, 'O': 2}
+
+# X_MASK[index] and O_MASK[index], built one more significant cell at a time
+X_MASK, O_MASK = [0], [0]
+for _cell in range(9):
+    _bit = 1 << _cell
+    X_MASK = X_MASK + [x | _bit for x in X_MASK] + X_MASK
+    O_MASK = O_MASK + O_MASK + [o | _bit for o in O_MASK]
+X_MASK, O_MASK = tuple(X_MASK), tuple(O_MASK)
+_EMPTY = [FULL & ~(x | o) for x, o in zip(X_MASK, O_MASK)]
+
+# Per-mask helpers: the cells completing a line of the mask, and the number
+# of lines the mask does not touch
+_COMPLETING = [0] * 512
+for _mask in range(512):
+    for _cell in range(9):
+        if not _mask >> _cell & 1 and IS_WIN[_mask | 1 << _cell]:
+            _COMPLETING[_mask] |= 1 << _cell
+_UNTOUCHED = [sum(1 for line in WIN_MASKS if not line & mask) for mask in range(512)]
+_POPCOUNT = [len(bits) for bits in BITS]
+
+# 'X', 'O' or None
+WINNER = tuple(['X' if IS_WIN[x] else 'O' if IS_WIN[o] else None for x, o in zip(X_MASK, O_MASK)])
+
+# True when every cell is taken
+IS_FULL = tuple([not empty for empty in _EMPTY])
+
+# Masks of the empty cells that would complete a line
+WINNING_CELLS = tuple([
+    (_COMPLETING[x] & empty, _COMPLETING[o] & empty)
+    for x, o, empty in zip(X_MASK, O_MASK, _EMPTY)
+])
+
+# Two-in-a-row threats: the number of empty cells that would complete a line
+THREATS = tuple([(_POPCOUNT[x], _POPCOUNT[o]) for x, o in WINNING_CELLS])
+
+# Lines without an opponent mark, still open to the player
+OPEN_LINES = tuple([(_UNTOUCHED[o], _UNTOUCHED[x]) for x, o in zip(X_MASK, O_MASK)])
+
+# Rows with an own mark and an empty cell, the minimax heuristic; the index
+# is r0 + 27 * r1 + 729 * r2 for the row states r0, r1 and r2
+_ROW = [
+    (int(bool(x) and bool(7 & ~(x | o))), int(bool(o) and bool(7 & ~(x | o))))
+    for x, o in zip(X_MASK[:27], O_MASK[:27])
+]
+OPEN_ROWS = tuple([
+    (x0 + x1 + x2, o0 + o1 + o2)
+    for x2, o2 in _ROW for x1, o1 in _ROW for x0, o0 in _ROW
+])
+
+
+def board_index(x_mask, o_mask):
+    """
+    Returns the table index of a small board given as two 9-bit masks.
+    """
+    return TERNARY[x_mask] + 2 * TERNARY[o_mask]
+
+
+def grid_index(grid):
+    """
+    Returns the table index of a 3x3 list of ' ', 'X' and 'O'.
+    """
+    index = 0
+    for row in reversed(grid):
+        for cell in reversed(row):
+            index = index * 3 + CELL_VALUES.get(cell, 0)
+    return index
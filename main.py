@@ -1,8 +1,23 @@
-import pygame
+import argparse
+import sys
 from minimax import UltimateTicTacToeAI
 from monte import MonteCarloAI
 from board import BigBoard, SmallBoard
-from gui import draw_board, get_cell, show_winner, starting_page, show_draw
+from thinking import PonderThread, SearchThread
+from book import load_book
+from endgame import EndgameSolver
+
+# Frames per second of the GUI loop
+FRAME_RATE = 30
+
+# Longest wait for an event while the AI is not searching, in milliseconds
+IDLE_WAIT = 250
+
+# Let the AI keep searching while the human chooses a move
+PONDERING = True
+
+# AI models by the number the player chooses, starting at 1
+AI_MODELS = ('minimax', 'monte')
 
 def get_board_choice(player, big_board):
     """
@@ -105,40 +120,45 @@ def check_smallboard(big_board, next_row, next_col):
     else:
         return next_row, next_col
 
-def main():
-    pygame.init()
-    screen = pygame.display.set_mode((600, 650))
-    pygame.display.set_caption("Ultimate Tic-Tac-Toe")
+def start_ponder(ai, big_board, next_row, next_col):
+    """
+    Starts the AI pondering on the human's time, if pondering is on.
+    """
+    if not PONDERING:
+        return None
+    active_box = None if next_row is None or next_col is None else (next_row, next_col)
+    return PonderThread(ai, convert_to_9x9(big_board), active_box).start()
+
+def stop_ponder(ponder):
+    """
+    Stops pondering, before the AI is asked for a move.
+    """
+    if ponder is not None:
+        ponder.cancel()
+    return None
+
+def make_ai(ai_algorithm, book, endgame):
+    """
+    Creates the AI model chosen by number: Minimax (1) or Monte Carlo (2).
+    """
+    if ai_algorithm == 2:
+        return MonteCarloAI(simulations=100, book=book, endgame=endgame)
+    return UltimateTicTacToeAI(max_depth=3, book=book, endgame=endgame)
 
+def play_command_line(book, endgame, ai_algorithm=None):
+    """
+    Plays a game on the command line, without loading pygame.
+    """
     big_board = BigBoard()
-    ai = UltimateTicTacToeAI(max_depth=3)  # Create AI instance
     current_player = 'X'
     next_board_row = None
     next_board_col = None
     player_types = {'X': 'AI', 'O': 'Human'}  # Define player types: 'AI' or 'Human'
-    subtitle = ""  # Text to display in the subtitle area
-
-    windows = int(input(f"Choose playing with command line (1) or GUI (2): "))
-    cmdln = False
-    run_gui = False
-
-    if windows == 1:
-        cmdln = True
-        run_gui = False
-    elif windows == 2:
-        run_gui = True
-        cmdln = False
-    else:
-        print ("invalid choice, please choose 1 or 2")
 
-    if cmdln:
+    if ai_algorithm is None:
         ai_algorithm = int(input(f"Choose playing with one of the two different AI models: Minimax (1) or Monte Carlo (2): "))
-
-        if ai_algorithm == 1:
-            ai = UltimateTicTacToeAI(max_depth=3)
-        elif ai_algorithm == 2:
-            ai = MonteCarloAI(simulations=100)
-    while cmdln:
+    ai = make_ai(ai_algorithm, book, endgame)
+    while True:
         print_board(big_board)
         # Choose the AI algorithm
         
@@ -152,6 +172,7 @@ def main():
         # Get move for the current player
         if player_types[current_player] == 'Human':
             next_board_row, next_board_col = check_smallboard(big_board, next_board_row, next_board_col)
+            ponder = start_ponder(ai, big_board, next_board_row, next_board_col)
             if next_board_row is not None and next_board_col is not None:
                 required_board = big_board.boards[next_board_row][next_board_col]
                 if required_board.winner is None and not required_board.is_full:
@@ -164,10 +185,12 @@ def main():
                 print(f"Player {current_player}, you can choose any board.")
                 board_row, board_col = get_board_choice(current_player, big_board)
             if board_row == 'quit':
+                stop_ponder(ponder)
                 print(f"Player {current_player} has quit the game.")
                 break
             current_board = big_board.boards[board_row][board_col]
             move_row, move_col = get_move_choice(current_player, current_board)
+            stop_ponder(ponder)
             if move_row == 'quit':
                 print(f"Player {current_player} has quit the game.")
                 break
@@ -188,30 +211,58 @@ def main():
         next_board_row = move_row
         next_board_col = move_col
         current_player = 'O' if current_player == 'X' else 'X'
-    
-    if run_gui:
-    # Starting Page
-        button1_rect, button2_rect = starting_page(screen)
-        algo_dec = None
 
-        while algo_dec is None:
+def play_gui(book, endgame, ai_algorithm=None):
+    """
+    Plays a game in a pygame window. pygame and gui are only imported
+    here, so command line play and the engines start without SDL.
+    """
+    import pygame
+    from gui import BoardView, get_cell, show_winner, starting_page, show_draw
+
+    pygame.init()
+    screen = pygame.display.set_mode((600, 650))
+    pygame.display.set_caption("Ultimate Tic-Tac-Toe")
+
+    big_board = BigBoard()
+    current_player = 'X'
+    next_board_row = None
+    next_board_col = None
+    player_types = {'X': 'AI', 'O': 'Human'}  # Define player types: 'AI' or 'Human'
+    subtitle = ""  # Text to display in the subtitle area
+
+    if ai_algorithm is None:
+        # Starting Page
+        button1_rect, button2_rect = starting_page(screen)
+        while ai_algorithm is None:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     pygame.quit()
                     return
                 if event.type == pygame.MOUSEBUTTONDOWN:
                     if button1_rect.collidepoint(event.pos):
-                        ai = UltimateTicTacToeAI(max_depth=3)
-                        algo_dec = True
+                        ai_algorithm = 1
                     elif button2_rect.collidepoint(event.pos):
-                        ai = MonteCarloAI(simulations=100)
-                        algo_dec = True
+                        ai_algorithm = 2
+    ai = make_ai(ai_algorithm, book, endgame)
+
     #gui
     run_gui = True
+    search = None  # Background AI search, while the AI is thinking
+    ponder = None  # Background AI search, while the human is thinking
+    clock = pygame.time.Clock()
+    view = BoardView(screen)
     while run_gui:
-        for event in pygame.event.get():
+        if search is None:
+            # Nothing animates, so sleep until there is something to handle
+            events = [pygame.event.wait(IDLE_WAIT)] + pygame.event.get()
+        else:
+            events = pygame.event.get()
+        for event in events:
             if event.type == pygame.QUIT:
                 run_gui = False
+            if event.type == pygame.WINDOWEXPOSED:
+                view.invalidate()
 
             if event.type == pygame.MOUSEBUTTONDOWN and player_types[current_player] == 'Human':
                 next_board_row, next_board_col = check_smallboard(big_board, next_board_row, next_board_col)
@@ -225,6 +276,7 @@ def main():
                 if (next_board_row is None or (board_row, board_col) == (next_board_row, next_board_col)) \
                         and small_board.make_move(move_row, move_col, current_player):
                     # Update game state
+                    ponder = stop_ponder(ponder)
                     subtitle = f"Player {current_player} played in box ({board_row}, {board_col})."
                     big_board.check_winner()
                     next_board_row, next_board_col = move_row, move_col
@@ -232,14 +284,27 @@ def main():
                 else:
                     subtitle = "Invalid move! You must play in the correct box."
 
-        # AI's move
-        if player_types[current_player] == 'AI' and run_gui:
+        if player_types[current_player] == 'Human' and run_gui and ponder is None:
+            next_board_row, next_board_col = check_smallboard(big_board, next_board_row, next_board_col)
+            ponder = start_ponder(ai, big_board, next_board_row, next_board_col)
+
+        # AI's move, searched in the background so the window stays responsive
+        if player_types[current_player] == 'AI' and run_gui and search is None:
             game_state = convert_to_9x9(big_board)
             next_board_row, next_board_col = check_smallboard(big_board, next_board_row, next_board_col)
             if next_board_row is None and next_board_col is None:
-                ai_move = ai.get_best_move(game_state, None)
+                search = SearchThread(ai, game_state, None).start()
             else:
-                ai_move = ai.get_best_move(game_state, (next_board_row, next_board_col))
+                search = SearchThread(ai, game_state, (next_board_row, next_board_col)).start()
+        if search is not None and not search.done():
+            dots = '.' * (pygame.time.get_ticks() // 400 % 3 + 1)
+            subtitle = f"AI ({current_player}) is thinking{dots}"
+            best = search.best_so_far()
+            if best is not None:
+                subtitle += f" Best so far: box ({best[0] // 3}, {best[1] // 3})"
+        elif search is not None:
+            ai_move = search.result()
+            search = None
             apply_ai_move(big_board, ai_move, current_player)
             subtitle = f"AI ({current_player}) played in box ({ai_move[0] // 3}, {ai_move[1] // 3})."
             big_board.check_winner()
@@ -248,13 +313,11 @@ def main():
             current_player = 'O' if current_player == 'X' else 'X'
         
 
-        # Draw the board and update the display
-        draw_board(screen, big_board)
-        font = pygame.font.Font(None, 30)
-        pygame.draw.rect(screen, (200, 200, 200), pygame.Rect(0, 600, 600, 50))
-        subtitle_text = font.render(subtitle, True, (0, 0, 0))
-        screen.blit(subtitle_text, (10, 610))
-        pygame.display.flip()
+        # Draw what changed and update only those parts of the display
+        dirty = view.draw(big_board, subtitle)
+        if dirty:
+            pygame.display.update(dirty)
+        clock.tick(FRAME_RATE)
 
         # Check for winner
         if big_board.winner:
@@ -267,7 +330,39 @@ def main():
             show_draw(screen)
             run_gui = False
 
+    if search is not None:
+        search.cancel(timeout=1)
+    stop_ponder(ponder)
     pygame.quit()
 
+def main(argv=None):
+    """
+    Command line entry point. Without --cli or --gui the player is asked.
+    """
+    parser = argparse.ArgumentParser(description="Play Ultimate Tic-Tac-Toe against an AI.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--cli', action='store_true', help='play on the command line, without opening a window')
+    mode.add_argument('--gui', action='store_true', help='play in a pygame window')
+    parser.add_argument('--ai', choices=AI_MODELS, help='AI model to play against, instead of asking')
+    args = parser.parse_args(argv)
+
+    if args.cli:
+        windows = 1
+    elif args.gui:
+        windows = 2
+    else:
+        windows = int(input(f"Choose playing with command line (1) or GUI (2): "))
+    if windows not in (1, 2):
+        print ("invalid choice, please choose 1 or 2")
+        return
+
+    book = load_book()  # Opening book built with book.py, if there is one
+    endgame = EndgameSolver()  # Plays exact moves once few empty cells are left
+    ai_algorithm = None if args.ai is None else AI_MODELS.index(args.ai) + 1
+    if windows == 1:
+        play_command_line(book, endgame, ai_algorithm)
+    else:
+        play_gui(book, endgame, ai_algorithm)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(sys.argv[1:])
\ No newline at end of file
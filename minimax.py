@@ -1,141 +1,335 @@
 import math
-from copy import deepcopy
+import time
+from bitboard import as_state, BITS, INDEX_TO_MOVE, PLAYERS
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+from ordering import MoveOrderer
+import rules
+
+class SearchTimeout(Exception):
+    """
+    Raised inside the search when the time or node budget runs out
+    """
+
 
 class UltimateTicTacToeAI:
     """
     For minimax algorithm
     """
-    def __init__(self, max_depth=3):
+    def __init__(self, max_depth=3, table_size=1 << 18, replacement='depth',
+                 time_limit=None, node_limit=None, ordering=None, book=None, endgame=None):
         """
         Initialize parameter for minimax
+
+        The transposition table keeps its entries between get_best_move
+        calls; call new_game to clear it. time_limit (seconds) and
+        node_limit are the default budgets of get_best_move. ordering is a
+        MoveOrderer, or False to search moves in board order. book is an
+        OpeningBook whose moves are played without searching. endgame is an
+        EndgameSolver whose proven moves are played once it applies.
+
+        cancel may be set to a threading.Event; setting it from another
+        thread stops the search, and best_so_far holds the best root move
+        found until then. pondered holds the (key, move, depth) of the last
+        position searched by ponder.
         """
         self.max_depth = max_depth
+        self.table = TranspositionTable(table_size, replacement)
+        self.ordering = MoveOrderer() if ordering is None else ordering
+        self.book = book
+        self.endgame = endgame
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.nodes = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.completed_depth = None
+        self.depth_limited = False
+        self.deadline = None
+        self.node_budget = None
+        self.next_check = math.inf
+        self.cancel = None
+        self.best_so_far = None
+        self.pondered = None
+        self.ponder_hits = 0
+
+    def new_game(self):
+        """
+        Forget everything learned in the previous game.
+        """
+        self.table.clear()
+        self.pondered = None
+
+    def ponder(self, game_state, active_box):
+        """
+        Search on the opponent's time, with the opponent ('O') to move.
+
+        The expected reply is the best move the transposition table holds for
+        the position, and the position it leads to is searched one ply deeper
+        at a time until cancel is set. If the opponent plays that reply,
+        get_best_move answers from the result or the table. Returns the
+        expected reply, or None if there is no legal move.
+        """
+        if self.cancel is None:
+            raise ValueError("ponder needs a cancel event to stop")
+        state = as_state(game_state, active_box, 'O').copy()
+        moves = state.legal_moves()
+        if not moves:
+            return None
+        entry = self.table.probe(state.key)
+        if entry is not None and entry[4] in moves:
+            reply = entry[4]
+        else:
+            reply = self.ordering.order(state, moves)[0] if self.ordering else moves[0]
+        state.play(reply)
+        if state.legal_moves():
+            move = self.get_best_move(state, None, time_limit=math.inf)
+            if self.completed_depth is not None:
+                self.pondered = (state.key, move, self.completed_depth)
+        return INDEX_TO_MOVE[reply]
 
     def minimax(self, game_state, depth, alpha, beta, maximizing_player, active_box):
         """
         the main logic of minimax, minimizing the opponent and maximize current 
         player’s performance to get the best result of play
+
+        game_state is either a 9x9 list or a BitState, which already carries
+        its active box. Moves are played on the state and undone on the way
+        back up, so a BitState is left as it was passed in.
         """
-        winner = self.check_winner(game_state)
-        if winner or depth == 0 or self.is_full(game_state):
-            return self.evaluate(game_state, winner)
+        state = as_state(game_state, active_box, 'X' if maximizing_player else 'O')
+        self.nodes += 1
+        if self.nodes >= self.next_check:
+            self.check_budget()
+        winner = rules.check_winner(state)
+        if winner or depth == 0 or state.is_full():
+            if not winner and depth == 0:
+                self.depth_limited = True
+            return self.evaluate(state, winner)
+
+        # Nodes just above the leaves are cheaper to search than to look up
+        use_table = depth > 1
+        entry = self.table.probe(state.key) if use_table else None
+        if entry is not None and entry[1] >= depth:
+            bound, value = entry[2], entry[3]
+            if bound == EXACT or (bound == LOWER and value >= beta) or (bound == UPPER and value <= alpha):
+                self.depth_limited = True
+                return value
+        alpha_orig, beta_orig = alpha, beta
+        best_move = None
 
-        valid_moves = self.get_valid_moves(game_state, active_box)
+        valid_moves = state.legal_moves()
+        if self.ordering:
+            valid_moves = self.ordering.order(state, valid_moves, entry[4] if entry else None)
         if maximizing_player:
             max_eval = -math.inf
-            for move in valid_moves:
-                new_state = self.apply_move(deepcopy(game_state), move, 'X')
-                next_active_box = (move[0] % 3, move[1] % 3)
-                eval = self.minimax(new_state, depth - 1, alpha, beta, False, next_active_box)
-                max_eval = max(max_eval, eval)
+            for i, move in enumerate(valid_moves):
+                state.play(move)
+                eval = self.minimax(state, depth - 1, alpha, beta, False, None)
+                state.undo()
+                if eval > max_eval:
+                    max_eval, best_move = eval, move
                 alpha = max(alpha, eval)
                 if beta <= alpha:
+                    self.record_cutoff(state, move, depth, i)
                     break  # Alpha-Beta Pruning
+            if use_table:
+                self.store(state, depth, max_eval, alpha_orig, beta_orig, best_move)
             return max_eval
         else:
             min_eval = math.inf
-            for move in valid_moves:
-                new_state = self.apply_move(deepcopy(game_state), move, 'O')
-                next_active_box = (move[0] % 3, move[1] % 3)
-                eval = self.minimax(new_state, depth - 1, alpha, beta, True, next_active_box)
-                min_eval = min(min_eval, eval)
+            for i, move in enumerate(valid_moves):
+                state.play(move)
+                eval = self.minimax(state, depth - 1, alpha, beta, True, None)
+                state.undo()
+                if eval < min_eval:
+                    min_eval, best_move = eval, move
                 beta = min(beta, eval)
                 if beta <= alpha:
+                    self.record_cutoff(state, move, depth, i)
                     break  # Alpha-Beta Pruning
+            if use_table:
+                self.store(state, depth, min_eval, alpha_orig, beta_orig, best_move)
             return min_eval
 
-    def get_best_move(self, game_state, active_box):
+    def record_cutoff(self, state, move, depth, index):
+        """
+        Count a cutoff caused by the index-th move searched and tell the move
+        ordering about it.
+        """
+        self.cutoffs += 1
+        if index == 0:
+            self.first_move_cutoffs += 1
+        if self.ordering:
+            self.ordering.record_cutoff(state, move, depth)
+
+    def search_stats(self):
+        """
+        Returns node and cutoff counts of the last search.
+
+        first_move_rate is the share of cutoffs caused by the first move
+        searched, a measure of how good the move ordering is.
+        """
+        return {
+            'nodes': self.nodes,
+            'cutoffs': self.cutoffs,
+            'first_move_cutoffs': self.first_move_cutoffs,
+            'first_move_rate': self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0,
+            'table_hits': self.table.hits,
+            'completed_depth': self.completed_depth,
+        }
+
+    def store(self, state, depth, value, alpha, beta, best_move):
+        """
+        Record a searched value in the transposition table with the bound it
+        represents for the (alpha, beta) window it was searched with.
+        """
+        if value <= alpha:
+            bound = UPPER
+        elif value >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.table.store(state.key, depth, bound, value, best_move)
+
+    def check_budget(self):
+        """
+        Raise SearchTimeout once the node or time budget is spent, or the
+        search is cancelled.
+        """
+        if self.cancel is not None and self.cancel.is_set():
+            raise SearchTimeout()
+        if self.node_budget is not None and self.nodes >= self.node_budget:
+            raise SearchTimeout()
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchTimeout()
+        self.next_check = self.nodes + 256
+        if self.node_budget is not None:
+            self.next_check = min(self.next_check, self.node_budget)
+
+    def get_best_move(self, game_state, active_box, time_limit=None, node_limit=None):
         """
         Find the best move of all the moves that the search tree leaves have.
+
+        Without a budget the search goes max_depth plies below the root
+        moves. With a time_limit in seconds or a node_limit it deepens one
+        ply at a time and returns the best move of the last iteration that
+        finished inside the budget.
+
+        A position in the opening book is answered from the book, and one
+        the endgame solver can prove is answered with the proven move. When
+        ponder already searched this position to max_depth or deeper, a
+        fixed-depth search returns the pondered move at once.
+        """
+        state = as_state(game_state, active_box, 'X')
+        time_limit = self.time_limit if time_limit is None else time_limit
+        node_limit = self.node_limit if node_limit is None else node_limit
+        if self.book is not None:
+            book_move = self.book.lookup(state)
+            if book_move is not None:
+                return INDEX_TO_MOVE[book_move]
+        if self.endgame is not None:
+            proven_move = self.endgame.best_move(state, self.cancel)
+            if proven_move is not None:
+                return INDEX_TO_MOVE[proven_move]
+        if (self.pondered is not None and self.pondered[0] == state.key and time_limit is None
+                and node_limit is None and self.pondered[2] >= self.max_depth):
+            self.ponder_hits += 1
+            return self.pondered[1]
+        valid_moves = state.legal_moves()
+        if not valid_moves:
+            return None
+
+        self.table.new_search()
+        self.table.hits = 0
+        if self.ordering:
+            self.ordering.new_search()
+            valid_moves = self.ordering.order(state, valid_moves)
+        self.nodes = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.completed_depth = None
+        self.node_budget = node_limit
+        self.deadline = None if time_limit is None else time.perf_counter() + time_limit
+        if time_limit is None and node_limit is None:
+            self.next_check = math.inf if self.cancel is None else 0
+            depths = [self.max_depth]
+        else:
+            self.next_check = 0
+            empty_cells = sum(len(BITS[state.empty(board)]) for board in range(9))
+            depths = range(empty_cells)
+
+        best_move = valid_moves[0]
+        self.best_so_far = INDEX_TO_MOVE[best_move]
+        root_length = len(state.history)
+        try:
+            for depth in depths:
+                self.depth_limited = False
+                best_move, best_eval = self.search_root(state, valid_moves, depth)
+                self.completed_depth = depth
+                self.best_so_far = INDEX_TO_MOVE[best_move]
+                # Search the best move first in the next iteration
+                valid_moves.remove(best_move)
+                valid_moves.insert(0, best_move)
+                if best_eval >= 100 or not self.depth_limited:
+                    break  # Forced win, or the whole tree fit inside this depth
+        except SearchTimeout:
+            while len(state.history) > root_length:
+                state.undo()
+        finally:
+            self.deadline = None
+            self.next_check = math.inf
+        return INDEX_TO_MOVE[best_move]
+
+    def search_root(self, state, valid_moves, depth):
+        """
+        Returns the best of valid_moves searched depth plies deep, and its
+        value.
         """
         best_eval = -math.inf
         best_move = None
-        valid_moves = self.get_valid_moves(game_state, active_box)
         for move in valid_moves:
-            new_state = self.apply_move(deepcopy(game_state), move, 'X')
-            next_active_box = (move[0] % 3, move[1] % 3)
-            move_eval = self.minimax(new_state, self.max_depth, -math.inf, math.inf, False, next_active_box)
+            state.play(move)
+            move_eval = self.minimax(state, depth, best_eval, math.inf, False, None)
+            state.undo()
             if move_eval > best_eval:
                 best_eval = move_eval
                 best_move = move
-        return best_move
+                if self.completed_depth is None:
+                    self.best_so_far = INDEX_TO_MOVE[move]
+        return best_move, best_eval
 
     def get_valid_moves(self, game_state, active_box):
         """
         Returns all available moves as tuples so they play in the target box.
+
+        If the target box is None, won or full, any empty cell of a small
+        board that is neither won nor full is valid.
         """
-        if active_box is not None:
-            box_row, box_col = active_box
-            valid_moves = [
-                (box_row * 3 + i, box_col * 3 + j)
-                for i in range(3) for j in range(3)
-                if game_state[box_row * 3 + i][box_col * 3 + j] == ' '
-            ]
-            if valid_moves:
-                return valid_moves
-        #if active box is None, check all possible moves in the board
-        #however, even though there are 9 boxes on the board, make sure that the box isn't full or already has a winner, 
-        #if the box already has a winner or is full, any empty cells in the full/winner box should not be included in the valid moves
-        valid_moves = []
-        for box_row in range(3):
-            for box_col in range(3):
-                box_start_row, box_start_col = box_row * 3, box_col * 3
-                box_winner = self.check_small_board(
-                    [row[box_start_col:box_start_col + 3] for row in game_state[box_start_row:box_start_row + 3]]
-                )
-                if box_winner is None:
-                    valid_moves.extend(
-                        [
-                            (box_start_row + i, box_start_col + j)
-                            for i in range(3) for j in range(3)
-                            if game_state[box_start_row + i][box_start_col + j] == ' '
-                        ]
-                    )
-        return valid_moves
+        return rules.get_valid_moves(game_state, active_box)
 
     def apply_move(self, game_state, move, player):
         """
         Applies a move to the board.
         """
-        i, j = move
-        game_state[i][j] = player
-        return game_state
+        return rules.apply_move(game_state, move, player)
 
     def check_winner(self, board):
         """
         Checks for a winner in any small board of the big board.
         """
-        for i in range(3):
-            for j in range(3):
-                small_board = [row[j * 3:(j + 1) * 3] for row in board[i * 3:(i + 1) * 3]]
-                winner = self.check_small_board(small_board)
-                if winner:
-                    return winner
-        return None
+        return rules.check_winner(board)
 
     def check_small_board(self, board):
         """
         Checks if there is a winner in a small board.
         """
-        for i in range(3):
-            if board[i][0] == board[i][1] == board[i][2] != ' ':
-                return board[i][0]
-            if board[0][i] == board[1][i] == board[2][i] != ' ':
-                return board[0][i]
-
-        # Check diagonals
-        if board[0][0] == board[1][1] == board[2][2] != ' ':
-            return board[0][0]
-        if board[0][2] == board[1][1] == board[2][0] != ' ':
-            return board[0][2]
-
-        return None
+        return rules.check_small_board(board)
 
     def is_full(self, game_state):
         """
         Checks if the entire board is full.
         """
-        return all(cell != ' ' for row in game_state for cell in row)
+        return rules.is_full(game_state)
 
     def evaluate(self, game_state, winner):
         """
@@ -146,21 +340,15 @@ class UltimateTicTacToeAI:
         elif winner == 'O':
             return -100  # Opponent wins
         else:
-            # Heuristic for ongoing game
-            x_score = self.count_lines(game_state, 'X')
-            o_score = self.count_lines(game_state, 'O')
-            return x_score - o_score
+            # Heuristic for ongoing game, kept up to date by BitState.play
+            open_rows = as_state(game_state).open_rows
+            return open_rows[0] - open_rows[1]
 
     def count_lines(self, game_state, player):
         """
         Count potential winning lines for a player.
+
+        A row counts when the player has a mark in it and it still has an
+        empty cell, in every small board that has no winner yet.
         """
-        score = 0
-        for i in range(3):
-            for j in range(3):
-                small_board = [row[j * 3:(j + 1) * 3] for row in game_state[i * 3:(i + 1) * 3]]
-                if self.check_small_board(small_board) is None:  # No winner yet
-                    for line in small_board:
-                        if line.count(player) > 0 and line.count(' ') > 0:
-                            score += 1
-        return score
+        return as_state(game_state).open_rows[PLAYERS.index(player)]
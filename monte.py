@@ -1,125 +1,413 @@
+import math
+import os
 import random
-from copy import deepcopy
+import time
+from bitboard import as_state, INDEX_TO_MOVE, IS_WIN, MOVE_TO_INDEX, PLAYERS
+from rollout import playout
+import rules
+
+class Node:
+    """
+    A node of the Monte Carlo search tree.
+
+    player is the index of the player who made move to reach the node, and
+    wins counts the playouts through the node won by that player (draws
+    count as half a win). key is the Zobrist key of the node's position,
+    used to find the node again after the opponent replies.
+    """
+    __slots__ = ('move', 'parent', 'player', 'key', 'children', 'untried', 'visits', 'wins')
+
+    def __init__(self, move, parent, player, key, untried):
+        """
+        Initialize an unvisited node
+        """
+        self.move = move
+        self.parent = parent
+        self.player = player
+        self.key = key
+        self.children = {}
+        self.untried = untried
+        self.visits = 0
+        self.wins = 0.0
+
+    def select_child(self, exploration):
+        """
+        Returns the child with the highest UCT score.
+        """
+        log_visits = math.log(self.visits)
+        return max(
+            self.children.values(),
+            key=lambda child: child.wins / child.visits + exploration * math.sqrt(log_visits / child.visits),
+        )
+
 
 class MonteCarloAI:
     """
     For Monte Carlo algoritm
+
+    Runs UCT Monte Carlo tree search under the full ultimate tic-tac-toe
+    rules. The tree is kept between moves, and the next search starts from
+    the subtree of the position the opponent's reply leads to.
     """
-    def __init__(self, simulations=100):
+    def __init__(self, simulations=100, exploration=math.sqrt(2), iterations=None, reuse_tree=True,
+                 seed=None, time_limit=None, book=None, endgame=None):
         """
         Initialize parameter for monte carlo algorithm
+
+        Each search runs iterations playouts, or simulations playouts per
+        legal root move when iterations is None. With a time_limit in
+        seconds it runs playouts until the time is up instead. seed makes
+        the search reproducible. book is an OpeningBook whose moves are
+        played without searching. endgame is an EndgameSolver whose proven
+        moves are played once it applies.
+
+        cancel may be set to a threading.Event; setting it from another
+        thread ends the search early, and best_so_far holds the most visited
+        root move found until then. reused_visits is the number of playouts
+        the last search found in the tree from earlier searches or ponder.
         """
         self.simulations = simulations
+        self.exploration = exploration
+        self.iterations = iterations
+        self.reuse_tree = reuse_tree
+        self.time_limit = time_limit
+        self.book = book
+        self.endgame = endgame
+        self.random = random.Random(seed)
+        self.root = None
+        self.cancel = None
+        self.best_so_far = None
+        self.reused_visits = 0
+
+    def new_game(self):
+        """
+        Forget the search tree of the previous game.
+        """
+        self.root = None
 
     def get_best_move(self, game_state, active_box):
         """
-        Find the best move using Monte Carlo simulations.
+        Find the best move using Monte Carlo tree search, or in the opening
+        book.
         """
-        valid_moves = self.get_valid_moves(game_state, active_box)
-        if not valid_moves:
+        state = as_state(game_state, active_box, 'X').copy()
+        state.history = []
+        if state.winner() or not state.legal_moves():
             return None
+        if self.book is not None:
+            book_move = self.book.lookup(state)
+            if book_move is not None:
+                return INDEX_TO_MOVE[book_move]
+        if self.endgame is not None:
+            proven_move = self.endgame.best_move(state, self.cancel)
+            if proven_move is not None:
+                return INDEX_TO_MOVE[proven_move]
+        winning_move = self.find_winning_move(state)
+        if winning_move is not None:
+            self.root = None
+            return INDEX_TO_MOVE[winning_move]
 
-        move_scores = {move: 0 for move in valid_moves}
+        root = self.search(state, self.budget(state), self.time_limit)
+        best = max(root.children.values(), key=lambda child: child.visits)
+        best.parent = None
+        self.root = best if self.reuse_tree else None
+        return INDEX_TO_MOVE[best.move]
+
+    def ponder(self, game_state, active_box, iterations=None):
+        """
+        Search on the opponent's time, with the opponent ('O') to move.
+
+        Playouts run until cancel is set or iterations ran, ten move budgets
+        by default. Every reply is searched in the kept tree, so the next
+        get_best_move starts from the subtree of the reply actually played.
+        """
+        if not self.reuse_tree:
+            return
+        state = as_state(game_state, active_box, 'O').copy()
+        state.history = []
+        if state.winner() or not state.legal_moves():
+            return
+        if iterations is None:
+            iterations = 10 * self.budget(state)
+        self.search(state, iterations)
+
+    def budget(self, state):
+        """
+        Returns the number of playouts to run for a move from state.
+        """
+        if self.iterations is not None:
+            return self.iterations
+        return self.simulations * len(state.legal_moves())
+
+    def search(self, state, iterations, time_limit=None):
+        """
+        Runs iterations rounds of tree search from state and returns the root
+        node, whose children hold the statistics of every root move.
+
+        With a time_limit in seconds, rounds run until it has passed instead.
+        Every 256 rounds best_so_far is updated and cancel is checked.
+        """
+        root = self.find_root(state)
+        self.reused_visits = root.visits
+        deadline = None if time_limit is None else time.perf_counter() + time_limit
+        count = 0
+        while deadline is not None or count < iterations:
+            self.iterate(root, state)
+            count += 1
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            if not count & 255 and root.children:
+                best = max(root.children.values(), key=lambda child: child.visits)
+                self.best_so_far = INDEX_TO_MOVE[best.move]
+                if self.cancel is not None and self.cancel.is_set():
+                    break
+        self.root = root if self.reuse_tree else None
+        return root
+
+    def find_winning_move(self, state):
+        """
+        Returns a move that wins the game at once, if there is one.
+        """
+        for move in state.legal_moves():
+            state.play(move)
+            won = IS_WIN[state.macro[1 - state.player]]
+            state.undo()
+            if won:
+                return move
+        return None
+
+    def find_root(self, state):
+        """
+        Returns the stored node for state if the tree reached it, otherwise a
+        new root. The stored root, its children and its grandchildren are
+        looked at, so the tree can be kept from before or after our move.
+        """
+        if self.root is not None:
+            candidates = [self.root]
+            for child in self.root.children.values():
+                candidates.append(child)
+                candidates.extend(child.children.values())
+            for node in candidates:
+                if node.key == state.key:
+                    node.parent = None
+                    return node
+        untried = [] if state.winner() else state.legal_moves()
+        return Node(None, None, 1 - state.player, state.key, untried)
+
+    def iterate(self, root, root_state):
+        """
+        One round of selection, expansion, playout and backpropagation.
+        """
+        state = root_state
+        node = root
+        depth = 0
+        while not node.untried and node.children:
+            node = node.select_child(self.exploration)
+            state.play(node.move)
+            depth += 1
 
-        for move in valid_moves:
-            for _ in range(self.simulations):
-                result = self.simulate_game(game_state, move, 'X')
-                if result == 'X':
-                    move_scores[move] += 1
-                elif result == 'O':
-                    move_scores[move] -= 1
+        if node.untried:
+            move = node.untried.pop(int(self.random.random() * len(node.untried)))
+            player = state.player
+            state.play(move)
+            depth += 1
+            untried = [] if state.winner() else state.legal_moves()
+            child = Node(move, node, player, state.key, untried)
+            node.children[move] = child
+            node = child
 
-        best_move = max(move_scores, key=move_scores.get)
-        return best_move
+        winner = playout(state, self.random)
+        for _ in range(depth):
+            state.undo()
+        while node is not None:
+            node.visits += 1
+            if winner is None:
+                node.wins += 0.5
+            elif winner == node.player:
+                node.wins += 1
+            node = node.parent
 
     def simulate_game(self, game_state, first_move, player):
         """
         Simulates a random game starting with the given move.
+
+        Returns the winner of the game, or None for a draw.
         """
-        sim_state = deepcopy(game_state)
-        self.apply_move(sim_state, first_move, player)
-        current_player = 'O' if player == 'X' else 'X'
+        state = as_state(game_state, None, player).copy()
+        state.play(MOVE_TO_INDEX[first_move])
+        winner = playout(state, self.random)
+        return None if winner is None else PLAYERS[winner]
 
-        while not self.is_over(sim_state):
-            valid_moves = self.get_valid_moves(sim_state, None)
-            random_move = random.choice(valid_moves)
-            self.apply_move(sim_state, random_move, current_player)
-            current_player = 'O' if current_player == 'X' else 'X'
+    def simulate_batch(self, game_state, first_move, player, count):
+        """
+        Simulates count random games starting with the given move in one
+        NumPy batch.
 
-        return self.check_winner(sim_state)
+        Returns the number of games won by 'X' and 'O' and drawn (None).
+        """
+        from batch import batch_playouts, count_results
+
+        state = as_state(game_state, None, player).copy()
+        state.play(MOVE_TO_INDEX[first_move])
+        return count_results(batch_playouts(state, count, self.random.getrandbits(64)))
 
     def get_valid_moves(self, game_state, active_box):
         """
          Returns all available moves as tuples so they play in the target box.
         """
-        if active_box is not None:
-            box_row, box_col = active_box
-            valid_moves = [
-                (box_row * 3 + i, box_col * 3 + j)
-                for i in range(3) for j in range(3)
-                if game_state[box_row * 3 + i][box_col * 3 + j] == ' '
-            ]
-            if valid_moves:
-                return valid_moves
-        valid_moves = []
-        for box_row in range(3):
-            for box_col in range(3):
-                box_start_row, box_start_col = box_row * 3, box_col * 3
-                box_winner = self.check_small_board(
-                    [row[box_start_col:box_start_col + 3] for row in game_state[box_start_row:box_start_row + 3]]
-                )
-                if box_winner is None:
-                    valid_moves.extend(
-                        [
-                            (box_start_row + i, box_start_col + j)
-                            for i in range(3) for j in range(3)
-                            if game_state[box_start_row + i][box_start_col + j] == ' '
-                        ]
-                    )
-        return valid_moves
+        return rules.get_valid_moves(game_state, active_box)
 
     def apply_move(self, game_state, move, player):
         """
         Applies a move to the board.
         """
-        i, j = move
-        game_state[i][j] = player
-        return game_state
+        return rules.apply_move(game_state, move, player)
 
     def is_over(self, game_state):
         """
         Checks if the game is over.
         """
-        return self.check_winner(game_state) is not None or all(
-            cell != ' ' for row in game_state for cell in row
-        )
+        return rules.is_over(game_state)
 
     def check_winner(self, game_state):
         """
         Checks for a winner in any small board of the big board.
         """
-        for i in range(3):
-            for j in range(3):
-                small_board = [row[j * 3:(j + 1) * 3] for row in game_state[i * 3:(i + 1) * 3]]
-                winner = self.check_small_board(small_board)
-                if winner:
-                    return winner
-        return None
+        return rules.check_winner(game_state)
 
     def check_small_board(self, board):
         """
         Checks for a winner in a small board.
         """
-        for i in range(3):
-            if board[i][0] == board[i][1] == board[i][2] != ' ':
-                return board[i][0]
-            if board[0][i] == board[1][i] == board[2][i] != ' ':
-                return board[0][i]
+        return rules.check_small_board(board)
 
-        # Check diagonals
-        if board[0][0] == board[1][1] == board[2][2] != ' ':
-            return board[0][0]
-        if board[0][2] == board[1][1] == board[2][0] != ' ':
-            return board[0][2]
 
-        return None
+def worker_loop(connection, settings, seed):
+    """
+    Serves search requests for ParallelMonteCarloAI in a worker process.
+
+    Each worker keeps its own tree between requests, so it reuses the work
+    of earlier moves like a single MonteCarloAI does.
+    """
+    ai = MonteCarloAI(seed=seed, **settings)
+    while True:
+        message = connection.recv()
+        if message[0] == 'search':
+            _, state, iterations = message
+            root = ai.search(state, iterations, ai.time_limit)
+            connection.send({move: (child.visits, child.wins) for move, child in root.children.items()})
+        elif message[0] == 'new_game':
+            ai.new_game()
+        else:
+            break
+    connection.close()
+
+
+class ParallelMonteCarloAI(MonteCarloAI):
+    """
+    Root-parallel Monte Carlo tree search over a pool of worker processes.
+
+    Every worker grows an independent tree from the same position with its
+    own share of the playouts, and the visit and win counts of the root moves
+    are summed before picking the most visited move. The workers are started
+    on the first move and stay alive until close is called.
+    """
+    def __init__(self, simulations=100, exploration=math.sqrt(2), iterations=None, reuse_tree=True,
+                 seed=None, workers=None, time_limit=None, book=None, endgame=None):
+        """
+        Initialize parameter for parallel monte carlo algorithm
+
+        workers defaults to the number of CPUs. With a seed, worker i is
+        seeded with seed + i and the moves chosen are reproducible. With a
+        time_limit every worker searches for that long.
+        """
+        super().__init__(simulations, exploration, iterations, reuse_tree, seed, time_limit, book,
+                         endgame)
+        self.workers = workers or os.cpu_count() or 1
+        self.seed = seed
+        self.processes = []
+        self.connections = []
+        self.statistics = {}
+
+    def start(self):
+        """
+        Starts the worker processes if they are not running yet.
+        """
+        if self.processes:
+            return
+        # Imported here so the serial AI does not pay for multiprocessing
+        from multiprocessing import Pipe, Process
+        settings = {'exploration': self.exploration, 'reuse_tree': self.reuse_tree,
+                    'time_limit': self.time_limit}
+        for i in range(self.workers):
+            parent_end, child_end = Pipe()
+            seed = None if self.seed is None else self.seed + i
+            process = Process(target=worker_loop, args=(child_end, settings, seed), daemon=True)
+            process.start()
+            child_end.close()
+            self.processes.append(process)
+            self.connections.append(parent_end)
+
+    def close(self):
+        """
+        Stops the worker processes.
+        """
+        for connection in self.connections:
+            connection.send(('close',))
+            connection.close()
+        for process in self.processes:
+            process.join()
+        self.processes = []
+        self.connections = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def ponder(self, game_state, active_box, iterations=None):
+        """
+        Pondering is not supported, the workers' trees are not shared.
+        """
+
+    def new_game(self):
+        """
+        Forget the search trees of the previous game.
+        """
+        for connection in self.connections:
+            connection.send(('new_game',))
+
+    def get_best_move(self, game_state, active_box):
+        """
+        Find the best move by merging the root statistics of all workers.
+        """
+        state = as_state(game_state, active_box, 'X').copy()
+        state.history = []
+        if state.winner() or not state.legal_moves():
+            return None
+        if self.book is not None:
+            book_move = self.book.lookup(state)
+            if book_move is not None:
+                return INDEX_TO_MOVE[book_move]
+        if self.endgame is not None:
+            proven_move = self.endgame.best_move(state, self.cancel)
+            if proven_move is not None:
+                return INDEX_TO_MOVE[proven_move]
+        winning_move = self.find_winning_move(state)
+        if winning_move is not None:
+            return INDEX_TO_MOVE[winning_move]
+
+        self.start()
+        share, extra = divmod(self.budget(state), self.workers)
+        for i, connection in enumerate(self.connections):
+            connection.send(('search', state, share + (i < extra)))
+        totals = {}
+        for connection in self.connections:
+            for move, (visits, wins) in connection.recv().items():
+                total_visits, total_wins = totals.get(move, (0, 0.0))
+                totals[move] = (total_visits + visits, total_wins + wins)
+        self.statistics = totals
+        best_move = max(sorted(totals), key=lambda move: totals[move][0])
+        return INDEX_TO_MOVE[best_move]
@@ -0,0 +1,81 @@
+"""
+Move ordering for the alpha-beta search in minimax.py.
+"""
+from lookup import WINNING_CELLS
+
+# Ordering scores, highest first; history scores stay below KILLER_SCORE
+HASH_SCORE = 1 << 30
+WIN_SCORE = 1 << 29
+BLOCK_SCORE = 1 << 28
+KILLER_SCORE = 1 << 27
+
+
+class MoveOrderer:
+    """
+    Sorts moves so the ones most likely to cause a cutoff are searched first.
+
+    In order: the best move stored in the transposition table, moves that win
+    a small board, moves that block an opponent's two-in-a-row in a small
+    board, the killer moves of the ply, then moves by history score. Each
+    heuristic can be switched off.
+    """
+    def __init__(self, hash_move=True, tactics=True, killers=True, history=True):
+        """
+        Initialize killer slots for every ply and empty history tables
+        """
+        self.use_hash_move = hash_move
+        self.use_tactics = tactics
+        self.use_killers = killers
+        self.use_history = history
+        self.killers = [[None, None] for _ in range(82)]
+        self.history = ([0] * 81, [0] * 81)
+
+    def new_search(self):
+        """
+        Forget killer moves and age the history scores between searches.
+        """
+        self.killers = [[None, None] for _ in range(82)]
+        for table in self.history:
+            for move in range(81):
+                table[move] >>= 1
+
+    def order(self, state, moves, hash_move=None):
+        """
+        Returns moves sorted best first for the side to move in state.
+        """
+        if not self.use_hash_move:
+            hash_move = None
+        player = state.player
+        boards = state.boards
+        killers = self.killers[len(state.history)] if self.use_killers else ()
+        history = self.history[state.player] if self.use_history else None
+        tactics = self.use_tactics
+
+        def score(move):
+            if move == hash_move:
+                return HASH_SCORE
+            value = history[move] if history is not None else 0
+            if tactics:
+                board, cell = divmod(move, 9)
+                winning_cells = WINNING_CELLS[boards[board]]
+                if winning_cells[player] >> cell & 1:
+                    return WIN_SCORE + value
+                if winning_cells[1 - player] >> cell & 1:
+                    return BLOCK_SCORE + value
+            if move in killers:
+                return KILLER_SCORE + value
+            return value
+
+        return sorted(moves, key=score, reverse=True)
+
+    def record_cutoff(self, state, move, depth):
+        """
+        Remember a move that caused a beta cutoff at the ply of state.
+        """
+        if self.use_killers:
+            killers = self.killers[len(state.history)]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+        if self.use_history:
+            self.history[state.player][move] += depth * depth
@@ -0,0 +1,151 @@
+"""
+Perft: counts the leaf positions of the game tree to a fixed depth.
+
+The counts follow the full rules: moves are sent to the box matching the
+cell just played, a won or full box gives a free choice, and the game ends
+when a player wins three boards in a row or every box is closed. Positions
+where the game ended before the depth are not counted.
+
+Any move generator taking (game_state, active_box) and returning (row, col)
+moves can be counted, so a new generator can be checked against the known
+numbers and timed on the same trees. Run this module to print counts:
+
+    python perft.py 4 --divide --generator rl
+"""
+import argparse
+import sys
+import time
+from bitboard import as_state, INDEX_TO_MOVE, PLAYERS
+import rules
+
+# Leaf counts from the empty board by depth
+EMPTY_BOARD_COUNTS = (1, 81, 720, 6336, 55080, 473256)
+
+
+def perft(game_state, depth, active_box=None, player='X', move_generator=None):
+    """
+    Returns the number of positions depth moves below game_state.
+
+    Without a move_generator the tree is walked on a BitState with
+    play/undo. With one, game_state must be a 9x9 list; it is modified
+    while counting and restored before returning.
+    """
+    if move_generator is None:
+        return count_state(as_state(game_state, active_box, player), depth)
+    return count_grid(game_state, depth, active_box, player, move_generator)
+
+
+def divide(game_state, depth, active_box=None, player='X', move_generator=None):
+    """
+    Returns a dict of the perft count below each root move, keyed by move.
+    """
+    if depth < 1:
+        raise ValueError("divide needs a depth of at least 1")
+    if as_state(game_state).winner():
+        return {}
+    if move_generator is None:
+        state = as_state(game_state, active_box, player)
+        counts = {}
+        for index in state.legal_moves():
+            state.play(index)
+            counts[INDEX_TO_MOVE[index]] = count_state(state, depth - 1)
+            state.undo()
+        return counts
+
+    counts = {}
+    opponent = PLAYERS[1 - PLAYERS.index(player)]
+    for move in move_generator(game_state, active_box):
+        i, j = move
+        game_state[i][j] = player
+        counts[move] = count_grid(game_state, depth - 1, (i % 3, j % 3), opponent, move_generator)
+        game_state[i][j] = ' '
+    return counts
+
+
+def count_state(state, depth):
+    """
+    Counts leaves below a BitState, leaving it as it was passed in.
+    """
+    if depth == 0:
+        return 1
+    if state.winner():
+        return 0
+    moves = state.legal_moves()
+    if depth == 1:
+        return len(moves)
+    total = 0
+    for index in moves:
+        state.play(index)
+        total += count_state(state, depth - 1)
+        state.undo()
+    return total
+
+
+def count_grid(game_state, depth, active_box, player, move_generator):
+    """
+    Counts leaves below a 9x9 list using move_generator for the moves.
+    """
+    if depth == 0:
+        return 1
+    if as_state(game_state).winner():
+        return 0
+    moves = move_generator(game_state, active_box)
+    if depth == 1:
+        return len(moves)
+    opponent = PLAYERS[1 - PLAYERS.index(player)]
+    total = 0
+    for i, j in moves:
+        game_state[i][j] = player
+        total += count_grid(game_state, depth - 1, (i % 3, j % 3), opponent, move_generator)
+        game_state[i][j] = ' '
+    return total
+
+
+def generators():
+    """
+    Returns the move generators of the engines, keyed by a short name.
+    """
+    from minimax import UltimateTicTacToeAI
+    from monte import MonteCarloAI
+    from RL import UltimateTicTacToeRL
+    return {
+        'rules': rules.get_valid_moves,
+        'minimax': UltimateTicTacToeAI().get_valid_moves,
+        'monte': MonteCarloAI().get_valid_moves,
+        'rl': UltimateTicTacToeRL().get_valid_moves,
+    }
+
+
+def main(argv=None):
+    """
+    Prints the perft count of the empty board, per root move with --divide.
+    """
+    parser = argparse.ArgumentParser(description="Count game tree leaves from the empty board.")
+    parser.add_argument('depth', type=int, nargs='?', default=4)
+    parser.add_argument('--divide', action='store_true', help='print the count below every root move')
+    parser.add_argument('--generator', choices=['bitboard', 'rules', 'minimax', 'monte', 'rl'],
+                        default='bitboard', help='move generator to count with')
+    args = parser.parse_args(argv)
+
+    move_generator = None if args.generator == 'bitboard' else generators()[args.generator]
+    game_state = [[' '] * 9 for _ in range(9)]
+    start = time.perf_counter()
+    if args.divide:
+        counts = divide(game_state, args.depth, move_generator=move_generator)
+        for move, count in sorted(counts.items()):
+            print(f"{move[0]},{move[1]}: {count}")
+        total = sum(counts.values())
+    else:
+        total = perft(game_state, args.depth, move_generator=move_generator)
+    elapsed = time.perf_counter() - start
+
+    print(f"perft({args.depth}) = {total}")
+    print(f"{elapsed:.3f} s, {total / elapsed:.0f} leaves/sec")
+    if args.depth < len(EMPTY_BOARD_COUNTS) and total != EMPTY_BOARD_COUNTS[args.depth]:
+        print(f"MISMATCH: expected {EMPTY_BOARD_COUNTS[args.depth]}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
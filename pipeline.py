@@ -0,0 +1,269 @@
+"""
+Multi-process actor/learner training for UltimateTicTacToeRL.
+
+Actor processes play batched self-play games (train.SelfPlay) against a
+memory-mapped snapshot of the Q-table and compute the TD target of every
+move from that snapshot, which acts as a target network. Each actor sends
+(key, action, target) records to the learner through its own ring buffer
+in shared memory. The learner, in the calling process, owns the QTable,
+applies
+
+    Q(key, action) += alpha * (target - Q(key, action))
+
+for every record, and writes a new snapshot for the actors every
+sync_interval records. An actor whose ring is full waits for the learner,
+so the actors never run more than a ring ahead of it.
+
+    python pipeline.py --actors 4 --episodes 100000 --output q.snapshot
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from multiprocessing import Event, Process, RawArray, Value
+import numpy as np
+from qtable import QSnapshot
+from RL import UltimateTicTacToeRL
+from train import SelfPlay, linear_schedule, parse_schedule, throughput
+
+# Record of one TD update sent from an actor to the learner; action is the
+# move index board*9+cell that UltimateTicTacToeRL reads its values under
+TRANSITION = np.dtype([('key', '<u8'), ('action', 'u1'), ('target', '<f4')])
+
+# Per-actor counters: episodes, transitions, seconds spent waiting for room
+ACTOR_STATS = ('episodes', 'transitions', 'waiting')
+
+
+class RingBuffer:
+    """
+    Single-producer, single-consumer ring of TRANSITION records in shared
+    memory.
+
+    head counts the records read and is written only by the consumer, tail
+    the records written and only by the producer. Both only grow; a record
+    n lives at n % capacity.
+    """
+    def __init__(self, capacity=1 << 16):
+        """
+        Allocate the shared buffer and counters
+        """
+        self.capacity = capacity
+        self.data = RawArray('B', capacity * TRANSITION.itemsize)
+        self.head = Value('Q', 0)
+        self.tail = Value('Q', 0)
+
+    def records(self):
+        """
+        Returns the buffer as a structured array.
+        """
+        return np.frombuffer(self.data, TRANSITION)
+
+    def __len__(self):
+        return self.tail.value - self.head.value
+
+    def push(self, keys, actions, targets):
+        """
+        Appends records if there is room for all of them, and returns
+        whether it did.
+        """
+        count = len(keys)
+        tail = self.tail.value
+        if tail + count - self.head.value > self.capacity:
+            return False
+        batch = np.empty(count, TRANSITION)
+        batch['key'] = keys
+        batch['action'] = actions
+        batch['target'] = targets
+        records = self.records()
+        start = tail % self.capacity
+        first = min(count, self.capacity - start)
+        records[start:start + first] = batch[:first]
+        records[:count - first] = batch[first:]
+        self.tail.value = tail + count
+        return True
+
+    def pop(self, limit):
+        """
+        Removes and returns up to limit records as a structured array.
+        """
+        head = self.head.value
+        count = min(self.tail.value - head, limit)
+        records = self.records()
+        start = head % self.capacity
+        first = min(count, self.capacity - start)
+        batch = np.concatenate((records[start:start + first], records[:count - first]))
+        self.head.value = head + count
+        return batch
+
+
+def run_actor(ring, counters, version, stop, path, episodes, batch_size, gamma, epsilon, seed):
+    """
+    Body of an actor process: plays episodes games and pushes their TD
+    targets into ring, reloading the snapshot at path whenever version
+    changes.
+    """
+    seen = version.value
+    play = SelfPlay(QSnapshot(path), episodes, batch_size, gamma, seed)
+    while not play.done() and not stop.is_set():
+        if version.value != seen:
+            seen = version.value
+            play.table = QSnapshot(path)
+        keys, actions, targets = play.step(epsilon(play.stats['episodes'] / episodes))
+        waited = time.perf_counter()
+        while not ring.push(keys, actions, targets):
+            if stop.is_set():
+                return
+            time.sleep(0.001)
+        counters[0] = play.stats['episodes']
+        counters[1] = play.stats['transitions']
+        counters[2] += time.perf_counter() - waited
+
+
+def publish(table, path):
+    """
+    Writes a snapshot of table to path, replacing the previous one in a
+    single step so actors never map a partial file.
+    """
+    table.save(path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+
+def run_pipeline(agent, episodes, actors=2, batch_size=64, epsilon=None, alpha=None, sync_interval=50_000,
+                 ring_size=1 << 16, seed=None, report_interval=None, output=print):
+    """
+    Trains agent with actor processes and returns throughput statistics.
+
+    The episodes are split between the actors. epsilon and alpha are
+    numbers or schedules as for train.train. With report_interval, a
+    dashboard line is passed to output every report_interval seconds.
+    """
+    if not callable(epsilon):
+        epsilon = linear_schedule(agent.epsilon if epsilon is None else epsilon)
+    if not callable(alpha):
+        alpha = linear_schedule(agent.alpha if alpha is None else alpha)
+    if isinstance(agent.q_table, QSnapshot):
+        raise ValueError("Cannot train a read-only Q-table")
+    if ring_size < 2 * batch_size:
+        # One step of an actor can finish a move in every game and end it
+        raise ValueError("ring_size must hold at least two records per game of a batch")
+    table = agent.q_table
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'policy.snapshot')
+        publish(table, path)
+        version = Value('Q', 1)
+        stop = Event()
+        rings = [RingBuffer(ring_size) for _ in range(actors)]
+        counters = [RawArray('d', len(ACTOR_STATS)) for _ in range(actors)]
+        processes = []
+        for number in range(actors):
+            share = episodes // actors + (number < episodes % actors)
+            processes.append(Process(target=run_actor, daemon=True, args=(
+                rings[number], counters[number], version, stop, path, share, batch_size,
+                agent.gamma, epsilon, None if seed is None else seed + number)))
+
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        applied = 0
+        since_sync = 0
+        reported = (start, 0)
+        try:
+            while True:
+                collected = sum(int(counter[0]) for counter in counters)
+                rate = alpha(collected / episodes)
+                received = 0
+                for ring in rings:
+                    batch = ring.pop(4096)
+                    received += len(batch)
+                    for key, action, target in zip(batch['key'].tolist(), batch['action'].tolist(),
+                                                   batch['target'].tolist()):
+                        table.add(key, action, rate * (target - table.get(key, action)))
+                applied += received
+                since_sync += received
+
+                if since_sync >= sync_interval:
+                    publish(table, path)
+                    with version.get_lock():
+                        version.value += 1
+                    since_sync = 0
+                now = time.perf_counter()
+                if report_interval is not None and now - reported[0] >= report_interval:
+                    output(dashboard(now - start, episodes, counters, rings, applied,
+                                     (applied - reported[1]) / (now - reported[0]), version.value))
+                    reported = (now, applied)
+                if not received:
+                    if not any(process.is_alive() for process in processes) and not any(map(len, rings)):
+                        break
+                    time.sleep(0.0005)
+        finally:
+            stop.set()
+            for process in processes:
+                process.join()
+
+    failed = [number for number, process in enumerate(processes) if process.exitcode]
+    if failed:
+        raise RuntimeError(f"Actor processes {failed} failed")
+    stats = throughput({
+        'episodes': sum(int(counter[0]) for counter in counters),
+        'transitions': sum(int(counter[1]) for counter in counters),
+    }, time.perf_counter() - start)
+    stats['applied'] = applied
+    stats['syncs'] = version.value - 1
+    stats['actors'] = [dict(zip(ACTOR_STATS, counter)) for counter in counters]
+    return stats
+
+
+def dashboard(seconds, episodes, counters, rings, applied, apply_rate, version):
+    """
+    Returns one line of training progress: episodes, the collection and
+    learning rates, how full the rings are, and each actor's transition
+    rate and share of time spent blocked on a full ring.
+    """
+    done = sum(int(counter[0]) for counter in counters)
+    collected = sum(int(counter[1]) for counter in counters)
+    backlog = sum(map(len, rings)) / sum(ring.capacity for ring in rings)
+    actors = ' '.join(f"{counter[1] / seconds / 1000:.0f}k/{counter[2] / seconds:.0%}" for counter in counters)
+    return (f"[{seconds:7.1f}s] episodes {done}/{episodes} | collected {collected} "
+            f"({collected / seconds:.0f}/s) | applied {applied} ({apply_rate:.0f}/s) | "
+            f"rings {backlog:.0%} full | policy v{version} | actors {actors}")
+
+
+def main(argv=None):
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Train the Q-learning agent with actor processes.")
+    parser.add_argument('--actors', type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument('--episodes', type=int, default=10000)
+    parser.add_argument('--batch', type=int, default=64, help='games stepped together by each actor')
+    parser.add_argument('--epsilon', type=parse_schedule, default='0.3:0.05', help="'start' or 'start:end'")
+    parser.add_argument('--alpha', type=parse_schedule, default='0.5:0.1', help="'start' or 'start:end'")
+    parser.add_argument('--gamma', type=float, default=0.9)
+    parser.add_argument('--sync-interval', type=int, default=50_000, help='updates between policy snapshots')
+    parser.add_argument('--ring-size', type=int, default=1 << 16, help='records buffered per actor')
+    parser.add_argument('--max-states', type=int, default=1_000_000, help='states kept in the Q-table')
+    parser.add_argument('--float16', action='store_true', help='store Q-values as float16')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--report-interval', type=float, default=1.0, help='seconds between dashboard lines')
+    parser.add_argument('--resume', help='snapshot to continue training from')
+    parser.add_argument('--output', help='snapshot file to write')
+    args = parser.parse_args(argv)
+
+    agent = UltimateTicTacToeRL(gamma=args.gamma, max_states=args.max_states,
+                                dtype=np.float16 if args.float16 else np.float32)
+    if args.resume:
+        agent.load(args.resume)
+    stats = run_pipeline(agent, args.episodes, args.actors, args.batch, args.epsilon, args.alpha,
+                         args.sync_interval, args.ring_size, args.seed, args.report_interval)
+    print(f"{stats['episodes']} episodes, {stats['transitions']} transitions in {stats['seconds']:.1f} s "
+          f"({stats['episodes_per_sec']:.0f} episodes/s, {stats['transitions_per_sec']:.0f} transitions/s), "
+          f"{stats['syncs']} policy syncs; {len(agent.q_table)} states stored")
+    if args.output:
+        agent.save(args.output)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,329 @@
+"""
+Compact, size-bounded Q-value store for UltimateTicTacToeRL.
+
+States are integer keys, such as BitState Zobrist keys, and actions are
+integers from 0 to 80. Only the actions written for a state are stored,
+each as one byte in an action arena and one float32 (or float16) in a
+value arena; every other action reads as the default value. An entry lives
+in one contiguous slot of both arenas, and the slots of evicted entries are
+reused by entries of the same size.
+
+Reads never insert. Once max_entries states are stored, writing a new
+state evicts the least recently used one.
+
+A table is saved as a snapshot file: a header followed by the sorted state
+keys, the offsets of each state's actions, and the value and action arenas:
+
+    magic (8 bytes) | version | signature | count | total | dtype |
+    keys[count] | offsets[count + 1] | values[total] | actions[total]
+
+QSnapshot maps a snapshot with np.memmap and answers the same reads as
+QTable by binary search, so opening one parses nothing but the header and
+processes reading the same file share its pages. QTable.from_snapshot
+copies a snapshot back into a table to resume training.
+"""
+import struct
+from collections import OrderedDict
+import numpy as np
+from bitboard import ZOBRIST_SIGNATURE
+
+MAGIC = b'UTTTQTAB'
+VERSION = 1
+HEADER = struct.Struct('<8sIQII4s')
+
+# Default number of states kept in memory
+MAX_ENTRIES = 1_000_000
+
+# Number of actions of a state
+ACTIONS = 81
+
+
+class QTable:
+    """
+    Maps (state key, action) to a Q-value with a bounded number of states.
+    """
+    def __init__(self, max_entries=MAX_ENTRIES, dtype=np.float32, default=0.0, capacity=1024):
+        """
+        Initialize empty arenas with room for capacity values
+        """
+        self.max_entries = max_entries
+        self.dtype = np.dtype(dtype)
+        self.default = default
+        self.index = OrderedDict()  # key -> (offset, length), least recently used first
+        self.actions = bytearray(capacity)
+        self.values = np.zeros(capacity, dtype=self.dtype)
+        self.top = 0
+        self.free = {}  # length -> offsets of unused slots
+        self.evictions = 0
+
+    @classmethod
+    def from_snapshot(cls, snapshot, max_entries=None):
+        """
+        Returns a table holding the states of a QSnapshot, with its value
+        type. max_entries defaults to the larger of the snapshot size and
+        MAX_ENTRIES.
+        """
+        if max_entries is None:
+            max_entries = max(len(snapshot), MAX_ENTRIES)
+        table = cls(max_entries, snapshot.values.dtype, capacity=max(len(snapshot.values), 1))
+        table.actions[:len(snapshot.actions)] = snapshot.actions.tobytes()
+        table.values[:len(snapshot.values)] = snapshot.values
+        table.top = len(snapshot.values)
+        offsets = snapshot.offsets.tolist()
+        table.index = OrderedDict(
+            (key, (offset, end - offset))
+            for key, offset, end in zip(snapshot.keys.tolist(), offsets, offsets[1:]))
+        while len(table.index) > max_entries:
+            table.evict()
+        return table
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def nbytes(self):
+        """
+        Returns the size of the arenas in bytes.
+        """
+        return len(self.actions) + self.values.nbytes
+
+    def get(self, key, action):
+        """
+        Returns Q(key, action), or the default if it was never written.
+        """
+        slot = self.index.get(key)
+        if slot is None:
+            return self.default
+        self.index.move_to_end(key)
+        offset, length = slot
+        position = self.actions.find(action, offset, offset + length)
+        if position < 0:
+            return self.default
+        return float(self.values[position])
+
+    def get_many(self, key, actions):
+        """
+        Returns the Q-values of a list of actions as a float array.
+        """
+        result = np.full(len(actions), self.default, dtype=np.float64)
+        slot = self.index.get(key)
+        if slot is None:
+            return result
+        self.index.move_to_end(key)
+        offset, length = slot
+        for i, action in enumerate(actions):
+            position = self.actions.find(action, offset, offset + length)
+            if position >= 0:
+                result[i] = self.values[position]
+        return result
+
+    def max_value(self, key, actions=None):
+        """
+        Returns the largest Q-value of a state over actions, by default all
+        81. Actions never written count at the default value.
+        """
+        if actions is not None:
+            return float(self.get_many(key, actions).max()) if len(actions) else self.default
+        slot = self.index.get(key)
+        if slot is None:
+            return self.default
+        self.index.move_to_end(key)
+        offset, length = slot
+        best = float(self.values[offset:offset + length].max())
+        return best if length == ACTIONS else max(best, self.default)
+
+    def set(self, key, action, value):
+        """
+        Sets Q(key, action), storing the state if it is new.
+        """
+        position = self.position(key, action)
+        self.values[position] = value
+
+    def add(self, key, action, delta):
+        """
+        Adds delta to Q(key, action), storing the state if it is new.
+        """
+        position = self.position(key, action)
+        self.values[position] += delta
+
+    def position(self, key, action):
+        """
+        Returns the arena position of (key, action), making room for it.
+        """
+        slot = self.index.get(key)
+        if slot is None:
+            if len(self.index) >= self.max_entries:
+                self.evict()
+            offset = self.allocate(1)
+            self.actions[offset] = action
+            self.values[offset] = self.default
+            self.index[key] = (offset, 1)
+            return offset
+
+        self.index.move_to_end(key)
+        offset, length = slot
+        position = self.actions.find(action, offset, offset + length)
+        if position >= 0:
+            return position
+        # Move the entry to a slot one action longer
+        new_offset = self.allocate(length + 1)
+        self.actions[new_offset:new_offset + length] = self.actions[offset:offset + length]
+        self.values[new_offset:new_offset + length] = self.values[offset:offset + length]
+        self.free.setdefault(length, []).append(offset)
+        position = new_offset + length
+        self.actions[position] = action
+        self.values[position] = self.default
+        self.index[key] = (new_offset, length + 1)
+        return position
+
+    def allocate(self, length):
+        """
+        Returns the offset of an unused slot of length values.
+        """
+        slots = self.free.get(length)
+        if slots:
+            return slots.pop()
+        if self.top + length > len(self.values):
+            capacity = max(2 * len(self.values), self.top + length)
+            self.actions.extend(bytes(capacity - len(self.actions)))
+            values = np.zeros(capacity, dtype=self.dtype)
+            values[:self.top] = self.values[:self.top]
+            self.values = values
+        offset = self.top
+        self.top += length
+        return offset
+
+    def evict(self):
+        """
+        Removes the least recently used state.
+        """
+        _, (offset, length) = self.index.popitem(last=False)
+        self.free.setdefault(length, []).append(offset)
+        self.evictions += 1
+
+    def items(self):
+        """
+        Yields (key, actions, values) for every stored state, with actions
+        as bytes and values as an array.
+        """
+        for key, (offset, length) in self.index.items():
+            yield key, bytes(self.actions[offset:offset + length]), self.values[offset:offset + length].copy()
+
+    def save(self, path):
+        """
+        Writes the table as a snapshot file, with its states in key order.
+        """
+        keys = np.fromiter(self.index, dtype=np.uint64, count=len(self.index))
+        slots = np.array(list(self.index.values()), dtype=np.int64).reshape(-1, 2)
+        order = np.argsort(keys)
+        keys, starts, lengths = keys[order], slots[order, 0], slots[order, 1]
+        offsets = np.zeros(len(keys) + 1, dtype=np.uint32)
+        np.cumsum(lengths, out=offsets[1:])
+        # Arena position of every stored value, in snapshot order
+        positions = np.repeat(starts - offsets[:-1], lengths) + np.arange(int(offsets[-1]))
+        values = self.values[positions]
+        actions = np.frombuffer(self.actions, dtype=np.uint8)[positions]
+        with open(path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, VERSION, ZOBRIST_SIGNATURE, len(keys), len(values),
+                                   self.dtype.str.encode()))
+            file.write(np.array(keys, dtype='<u8').tobytes())
+            file.write(offsets.astype('<u4').tobytes())
+            file.write(values.astype(self.dtype.newbyteorder('<')).tobytes())
+            file.write(actions.tobytes())
+
+
+class QSnapshot:
+    """
+    Read-only view of a Q-table snapshot file through np.memmap.
+    """
+    def __init__(self, path):
+        """
+        Map the snapshot file and check its header
+        """
+        self.data = np.memmap(path, dtype=np.uint8, mode='r')
+        if len(self.data) < HEADER.size:
+            raise ValueError(f"{path} is not a Q-table snapshot")
+        magic, version, signature, count, total, dtype = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} Q-table snapshot")
+        if signature != ZOBRIST_SIGNATURE:
+            raise ValueError(f"{path} was built with different Zobrist keys")
+        try:
+            dtype = np.dtype(dtype.rstrip(b'\0').decode())
+        except (TypeError, UnicodeDecodeError):
+            raise ValueError(f"{path} has an unknown value type") from None
+        values_offset = HEADER.size + 8 * count + 4 * (count + 1)
+        if len(self.data) != values_offset + (dtype.itemsize + 1) * total:
+            raise ValueError(f"{path} is truncated")
+        self.keys = np.frombuffer(self.data, '<u8', count, HEADER.size)
+        self.offsets = np.frombuffer(self.data, '<u4', count + 1, HEADER.size + 8 * count)
+        self.values = np.frombuffer(self.data, dtype, total, values_offset)
+        self.actions = np.frombuffer(self.data, np.uint8, total, values_offset + dtype.itemsize * total)
+        self.default = 0.0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return self.find(key) is not None
+
+    def find(self, key):
+        """
+        Returns the (offset, length) of a state's actions, or None.
+        """
+        key = np.uint64(key)
+        i = int(np.searchsorted(self.keys, key))
+        if i == len(self.keys) or self.keys[i] != key:
+            return None
+        offset = int(self.offsets[i])
+        return offset, int(self.offsets[i + 1]) - offset
+
+    def get(self, key, action):
+        """
+        Returns Q(key, action), or the default if it was never written.
+        """
+        return float(self.get_many(key, [action])[0])
+
+    def get_many(self, key, actions):
+        """
+        Returns the Q-values of a list of actions as a float array.
+        """
+        result = np.full(len(actions), self.default, dtype=np.float64)
+        slot = self.find(key)
+        if slot is None:
+            return result
+        offset, length = slot
+        stored = self.actions[offset:offset + length].tolist()
+        for i, action in enumerate(actions):
+            if action in stored:
+                result[i] = self.values[offset + stored.index(action)]
+        return result
+
+    def max_value(self, key, actions=None):
+        """
+        Returns the largest Q-value of a state over actions, by default all
+        81. Actions never written count at the default value.
+        """
+        if actions is not None:
+            return float(self.get_many(key, actions).max()) if len(actions) else self.default
+        slot = self.find(key)
+        if slot is None:
+            return self.default
+        offset, length = slot
+        best = float(self.values[offset:offset + length].max())
+        return best if length == ACTIONS else max(best, self.default)
+
+    def close(self):
+        """
+        Drops the arrays; the file is unmapped once no other reference to
+        them is left.
+        """
+        self.data = self.keys = self.offsets = self.values = self.actions = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,76 @@
+"""
+Game rules shared by the minimax, Monte Carlo and reinforcement learning players.
+
+Positions are 9x9 lists of ' ', 'X' and 'O' or BitStates, and moves are
+(row, col) tuples. A BitState keeps the legal moves of each small board
+cached and updates them as moves are played; for lists the legal moves of
+recent (position, active box) pairs are cached here.
+"""
+from functools import lru_cache
+from lookup import grid_index, WINNER
+from bitboard import as_state, BitState, BITS, INDEX_TO_MOVE
+
+
+def get_valid_moves(game_state, active_box):
+    """
+    Returns all available moves as tuples so they play in the target box.
+
+    If the target box is None, won or full, any empty cell of a small board
+    that is neither won nor full is valid. The active box of a BitState is
+    its own.
+    """
+    if isinstance(game_state, BitState):
+        return [INDEX_TO_MOVE[move] for move in game_state.legal_moves()]
+    return list(cached_moves(tuple(map(tuple, game_state)), active_box))
+
+
+@lru_cache(maxsize=4096)
+def cached_moves(grid, active_box):
+    """
+    Returns the legal moves of a position given as a tuple of rows.
+    """
+    return tuple(INDEX_TO_MOVE[move] for move in BitState.from_grid(grid, active_box).legal_moves())
+
+
+def apply_move(game_state, move, player):
+    """
+    Applies a move to the board.
+    """
+    i, j = move
+    game_state[i][j] = player
+    return game_state
+
+
+def check_winner(game_state):
+    """
+    Checks for a winner in any small board of the big board.
+
+    Returns the winner of the lowest-numbered won board, or None.
+    """
+    state = as_state(game_state)
+    won = state.macro[0] | state.macro[1]
+    if not won:
+        return None
+    return state.board_winner(BITS[won][0])
+
+
+def check_small_board(board):
+    """
+    Checks for a winner in a 3x3 small board.
+    """
+    return WINNER[grid_index(board)]
+
+
+def is_full(game_state):
+    """
+    Checks if the entire board is full.
+    """
+    return as_state(game_state).is_full()
+
+
+def is_over(game_state):
+    """
+    Checks if a small board has been won or the board is full.
+    """
+    state = as_state(game_state)
+    return check_winner(state) is not None or state.is_full()
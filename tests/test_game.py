@@ -327,5 +327,1184 @@ class TestMainFunctions(unittest.TestCase):
         self.assertEqual(len(board_9x9), 9)
         self.assertEqual(len(board_9x9[0]), 9)
 
+from bitboard import BitState, INDEX_TO_MOVE, MOVE_TO_INDEX
+
+class TestBitState(unittest.TestCase):
+
+    def setUp(self):
+        self.empty_board = [[' ' for _ in range(9)] for _ in range(9)]
+
+    def test_grid_round_trip(self):
+        self.empty_board[0][0] = 'X'
+        self.empty_board[4][7] = 'O'
+        state = BitState.from_grid(self.empty_board)
+        self.assertEqual(state.to_grid(), self.empty_board)
+
+    def test_move_index_conversion(self):
+        self.assertEqual(INDEX_TO_MOVE[0], (0, 0))
+        self.assertEqual(INDEX_TO_MOVE[80], (8, 8))
+        self.assertEqual(MOVE_TO_INDEX[(4, 7)], 5 * 9 + 4)
+
+    def test_legal_moves(self):
+        state = BitState()
+        self.assertEqual(len(state.legal_moves()), 81)
+        state.play(MOVE_TO_INDEX[(0, 4)])
+        self.assertEqual(state.active, 1)
+        self.assertEqual(state.player, 1)
+        self.assertEqual([INDEX_TO_MOVE[move] for move in state.legal_moves()],
+                         [(i, j) for i in range(3) for j in range(3, 6) if (i, j) != (0, 4)])
+
+    def test_small_board_win_closes_board(self):
+        for col in range(3):
+            self.empty_board[0][col] = 'X'
+        state = BitState.from_grid(self.empty_board, (0, 0))
+        self.assertEqual(state.board_winner(0), 'X')
+        self.assertIsNone(state.active)
+        self.assertEqual(len(state.legal_moves()), 72)
+        self.assertIsNone(state.winner())
+
+    def test_undo_restores_state(self):
+        self.empty_board[0][0] = 'X'
+        self.empty_board[0][1] = 'X'
+        state = BitState.from_grid(self.empty_board, (0, 0))
+        before = (state.to_grid(), state.macro[:], state.closed, state.active, state.player)
+        state.play(MOVE_TO_INDEX[(0, 2)])
+        self.assertEqual(state.board_winner(0), 'X')
+        self.assertEqual(state.closed, 1)
+        state.undo()
+        self.assertEqual((state.to_grid(), state.macro, state.closed, state.active, state.player), before)
+
+    def test_search_leaves_state_unchanged(self):
+        state = BitState.from_grid(self.empty_board, (1, 1))
+        UltimateTicTacToeAI(max_depth=2).get_best_move(state, None)
+        self.assertEqual(state.to_grid(), self.empty_board)
+        self.assertEqual((state.active, state.player, state.history), (4, 0, []))
+
+    def test_open_rows_incremental(self):
+        ai = UltimateTicTacToeAI()
+        state = BitState()
+        for move in (MOVE_TO_INDEX[(0, 0)], MOVE_TO_INDEX[(0, 1)], MOVE_TO_INDEX[(1, 4)], MOVE_TO_INDEX[(4, 4)]):
+            state.play(move)
+            grid = state.to_grid()
+            self.assertEqual(state.open_rows, BitState.from_grid(grid).open_rows)
+            self.assertEqual(ai.evaluate(state, None), ai.evaluate(grid, None))
+        while state.history:
+            state.undo()
+        self.assertEqual(state.open_rows, [0, 0])
+
+    def test_game_winner(self):
+        state = BitState()
+        state.macro[1] = 0b100010001
+        self.assertEqual(state.winner(), 'O')
+        self.assertTrue(state.is_over())
+
+from transposition import TranspositionTable, EXACT, LOWER
+
+class TestTranspositionTable(unittest.TestCase):
+
+    def test_incremental_key(self):
+        state = BitState()
+        start = state.key
+        for move in (MOVE_TO_INDEX[(0, 4)], MOVE_TO_INDEX[(1, 4)], MOVE_TO_INDEX[(4, 4)]):
+            state.play(move)
+            self.assertEqual(state.key, state.compute_key())
+        for _ in range(3):
+            state.undo()
+        self.assertEqual(state.key, start)
+
+    def test_key_includes_active_box_and_side(self):
+        grid = [[' ' for _ in range(9)] for _ in range(9)]
+        keys = {BitState.from_grid(grid, None, 'X').key,
+                BitState.from_grid(grid, (0, 0), 'X').key,
+                BitState.from_grid(grid, None, 'O').key}
+        self.assertEqual(len(keys), 3)
+
+    def test_probe_and_store(self):
+        table = TranspositionTable(size=16)
+        table.store(5, 3, EXACT, 7, 10)
+        self.assertEqual(table.probe(5)[:5], (5, 3, EXACT, 7, 10))
+        self.assertIsNone(table.probe(21))  # Same slot, different key
+
+    def test_depth_replacement(self):
+        table = TranspositionTable(size=16, replacement='depth')
+        table.store(5, 3, EXACT, 7, 10)
+        table.store(21, 1, LOWER, 2, 11)
+        self.assertIsNotNone(table.probe(5))
+        table.new_search()
+        table.store(21, 1, LOWER, 2, 11)
+        self.assertIsNotNone(table.probe(21))
+
+    def test_always_replacement(self):
+        table = TranspositionTable(size=16, replacement='always')
+        table.store(5, 3, EXACT, 7, 10)
+        table.store(21, 1, LOWER, 2, 11)
+        self.assertIsNone(table.probe(5))
+
+    def test_table_persists_between_moves(self):
+        ai = UltimateTicTacToeAI(max_depth=3)
+        ai.get_best_move([[' ' for _ in range(9)] for _ in range(9)], (1, 1))
+        self.assertGreater(len(ai.table), 0)
+        ai.new_game()
+        self.assertEqual(len(ai.table), 0)
+
+class TestIterativeDeepening(unittest.TestCase):
+
+    def setUp(self):
+        self.ai = UltimateTicTacToeAI(max_depth=3)
+        self.empty_board = [[' ' for _ in range(9)] for _ in range(9)]
+
+    def test_time_limit(self):
+        import time
+        start_time = time.time()
+        best_move = self.ai.get_best_move(self.empty_board, None, time_limit=0.2)
+        self.assertLess(time.time() - start_time, 0.5)
+        self.assertIn(best_move, self.ai.get_valid_moves(self.empty_board, None))
+        self.assertIsNotNone(self.ai.completed_depth)
+
+    def test_node_limit(self):
+        best_move = self.ai.get_best_move(self.empty_board, (1, 1), node_limit=500)
+        self.assertLessEqual(self.ai.nodes, 500)
+        self.assertIn(best_move, self.ai.get_valid_moves(self.empty_board, (1, 1)))
+
+    def test_state_restored_after_timeout(self):
+        state = BitState.from_grid(self.empty_board)
+        self.ai.get_best_move(state, None, node_limit=1000)
+        self.assertEqual(state.to_grid(), self.empty_board)
+        self.assertEqual(state.history, [])
+
+    def test_stops_when_tree_is_exhausted(self):
+        self.empty_board[0][0] = 'X'
+        self.empty_board[0][1] = 'X'
+        best_move = self.ai.get_best_move(self.empty_board, (0, 0), time_limit=5)
+        self.assertEqual(best_move, (0, 2))
+        self.assertEqual(self.ai.completed_depth, 0)
+
+from ordering import MoveOrderer
+
+class TestMoveOrdering(unittest.TestCase):
+
+    def setUp(self):
+        self.empty_board = [[' ' for _ in range(9)] for _ in range(9)]
+        self.orderer = MoveOrderer()
+
+    def test_tactical_moves_first(self):
+        self.empty_board[0][0] = 'X'
+        self.empty_board[0][1] = 'X'
+        self.empty_board[2][0] = 'O'
+        self.empty_board[2][1] = 'O'
+        state = BitState.from_grid(self.empty_board, (0, 0), 'X')
+        ordered = self.orderer.order(state, state.legal_moves())
+        self.assertEqual(INDEX_TO_MOVE[ordered[0]], (0, 2))  # Wins the board
+        self.assertEqual(INDEX_TO_MOVE[ordered[1]], (2, 2))  # Blocks O
+
+    def test_hash_move_first(self):
+        state = BitState()
+        ordered = self.orderer.order(state, state.legal_moves(), hash_move=40)
+        self.assertEqual(ordered[0], 40)
+        self.assertEqual(sorted(ordered), list(range(81)))
+
+    def test_killers_and_history(self):
+        state = BitState()
+        self.orderer.record_cutoff(state, 30, 3)
+        self.orderer.record_cutoff(state, 20, 1)
+        ordered = self.orderer.order(state, state.legal_moves())
+        self.assertEqual(ordered[:2], [30, 20])
+        self.orderer.new_search()
+        self.assertEqual(self.orderer.history[0][30], 4)
+        self.assertEqual(self.orderer.killers[0], [None, None])
+
+    def test_cutoff_statistics(self):
+        ai = UltimateTicTacToeAI(max_depth=3)
+        ai.get_best_move(self.empty_board, None)
+        stats = ai.search_stats()
+        self.assertGreater(stats['cutoffs'], 0)
+        self.assertLessEqual(stats['first_move_cutoffs'], stats['cutoffs'])
+        self.assertEqual(stats['nodes'], ai.nodes)
+
+    def test_unordered_search(self):
+        ai = UltimateTicTacToeAI(max_depth=2, ordering=False)
+        best_move = ai.get_best_move(self.empty_board, (1, 1))
+        self.assertIn(best_move, ai.get_valid_moves(self.empty_board, (1, 1)))
+
+class TestMonteCarloTreeSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.ai = MonteCarloAI(iterations=300)
+        self.empty_board = [[' ' for _ in range(9)] for _ in range(9)]
+
+    def test_finds_winning_move(self):
+        # X has won boards 0 and 1 and can win board 2, and the game, at (0, 8)
+        for col in range(3):
+            self.empty_board[0][col] = 'X'
+            self.empty_board[1][3 + col] = 'X'
+        self.empty_board[0][6] = 'X'
+        self.empty_board[0][7] = 'X'
+        best_move = self.ai.get_best_move(self.empty_board, (0, 2))
+        self.assertEqual(best_move, (0, 8))
+
+    def test_tree_reused_after_reply(self):
+        state = BitState()
+        best_move = self.ai.get_best_move(state, None)
+        state.play(MOVE_TO_INDEX[best_move])
+        reply = max(self.ai.root.children.values(), key=lambda child: child.visits)
+        state.play(reply.move)
+        self.assertIs(self.ai.find_root(state), reply)
+        self.assertGreater(reply.visits, 0)
+
+    def test_new_tree_for_unknown_position(self):
+        self.ai.get_best_move(self.empty_board, None)
+        self.empty_board[8][8] = 'O'
+        self.empty_board[8][7] = 'O'
+        root = self.ai.find_root(BitState.from_grid(self.empty_board, None))
+        self.assertEqual(root.visits, 0)
+        self.ai.new_game()
+        self.assertIsNone(self.ai.root)
+
+    def test_visits_add_up(self):
+        self.ai.get_best_move(self.empty_board, (1, 1))
+        self.assertIsNone(self.ai.root.parent)
+        self.assertEqual(self.ai.root.visits, sum(child.visits for child in self.ai.root.children.values()) + 1)
+
+import random
+from rollout import playout, is_dead_draw
+
+class TestRolloutKernel(unittest.TestCase):
+
+    def test_seeded_playouts_repeat(self):
+        state = BitState()
+        first = [playout(state, random.Random(7)) for _ in range(5)]
+        second = [playout(state, random.Random(7)) for _ in range(5)]
+        self.assertEqual(first, second)
+        self.assertEqual(state.history, [])
+        self.assertEqual(state.to_grid(), [[' '] * 9 for _ in range(9)])
+
+    def test_respects_active_box(self):
+        # X has won boards 0 and 1; board 2 has a single empty cell that wins
+        grid = [[' '] * 9 for _ in range(9)]
+        for col in range(3):
+            grid[0][col] = 'X'
+            grid[1][3 + col] = 'X'
+        for row, line in enumerate(['XX ', 'OOX', 'XOO']):
+            for col, cell in enumerate(line):
+                grid[row][6 + col] = cell
+        state = BitState.from_grid(grid, (0, 2), 'X')
+        for seed in range(20):
+            self.assertEqual(playout(state, random.Random(seed)), 0)
+
+    def test_finished_game(self):
+        state = BitState()
+        state.macro[1] = 0b000000111
+        self.assertEqual(playout(state), 1)
+
+    def test_dead_draw(self):
+        # X holds boards 0, 1, 5, 6 and O boards 2, 3, 4, 7, so every line of
+        # small boards is blocked for both even though board 8 is open
+        x_boards, o_boards = 0b001100011, 0b010011100
+        self.assertTrue(is_dead_draw([x_boards, o_boards], x_boards | o_boards))
+        self.assertFalse(is_dead_draw([x_boards, 0], x_boards))
+        self.assertFalse(is_dead_draw([0, 0], 0))
+
+from monte import ParallelMonteCarloAI
+
+class TestParallelMonteCarloAI(unittest.TestCase):
+
+    def setUp(self):
+        self.empty_board = [[' ' for _ in range(9)] for _ in range(9)]
+
+    def play_moves(self):
+        with ParallelMonteCarloAI(iterations=400, workers=2, seed=11) as ai:
+            moves = [ai.get_best_move(self.empty_board, None), ai.get_best_move(self.empty_board, (1, 1))]
+            statistics = ai.statistics
+        return moves, statistics
+
+    def test_seeded_search_is_reproducible(self):
+        first_moves, statistics = self.play_moves()
+        second_moves, _ = self.play_moves()
+        self.assertEqual(first_moves, second_moves)
+        self.assertEqual(sum(visits for visits, _ in statistics.values()), 400)
+
+    def test_workers_stay_alive_between_moves(self):
+        ai = ParallelMonteCarloAI(iterations=100, workers=2, seed=1)
+        try:
+            best_move = ai.get_best_move(self.empty_board, None)
+            self.assertIn(best_move, ai.get_valid_moves(self.empty_board, None))
+            processes = list(ai.processes)
+            ai.get_best_move(self.empty_board, (0, 0))
+            self.assertEqual(ai.processes, processes)
+            self.assertTrue(all(process.is_alive() for process in processes))
+        finally:
+            ai.close()
+        self.assertEqual(ai.processes, [])
+
+from batch import batch_playouts, count_results, DRAW
+
+class TestBatchPlayouts(unittest.TestCase):
+
+    def test_results_are_valid(self):
+        results = batch_playouts(BitState(), 500, 3)
+        self.assertEqual(len(results), 500)
+        self.assertTrue(set(results.tolist()) <= {0, 1, DRAW})
+        counts = count_results(results)
+        self.assertEqual(sum(counts.values()), 500)
+
+    def test_seeded_batch_repeats(self):
+        self.assertEqual(batch_playouts(BitState(), 200, 5).tolist(), batch_playouts(BitState(), 200, 5).tolist())
+
+    def test_respects_active_box(self):
+        # Same position as TestRolloutKernel: the only legal move wins for X
+        grid = [[' '] * 9 for _ in range(9)]
+        for col in range(3):
+            grid[0][col] = 'X'
+            grid[1][3 + col] = 'X'
+        for row, line in enumerate(['XX ', 'OOX', 'XOO']):
+            for col, cell in enumerate(line):
+                grid[row][6 + col] = cell
+        state = BitState.from_grid(grid, (0, 2), 'X')
+        self.assertEqual(count_results(batch_playouts(state, 100, 0))['X'], 100)
+
+    def test_monte_carlo_batch(self):
+        ai = MonteCarloAI(seed=2)
+        counts = ai.simulate_batch([[' '] * 9 for _ in range(9)], (4, 4), 'X', 300)
+        self.assertEqual(set(counts), {'X', 'O', None})
+        self.assertEqual(sum(counts.values()), 300)
+
+import lookup
+
+class TestLookupTables(unittest.TestCase):
+
+    def test_index_encoding(self):
+        grid = [['X', ' ', 'O'],
+                [' ', 'X', ' '],
+                [' ', ' ', ' ']]
+        index = lookup.grid_index(grid)
+        self.assertEqual(index, 1 + 2 * 9 + 1 * 81)
+        self.assertEqual(index, lookup.board_index(0b000010001, 0b000000100))
+        self.assertEqual((lookup.X_MASK[index], lookup.O_MASK[index]), (0b000010001, 0b000000100))
+
+    def test_winner_and_full(self):
+        self.assertEqual(lookup.WINNER[lookup.board_index(0b100010001, 0b000001010)], 'X')
+        self.assertEqual(lookup.WINNER[lookup.board_index(0b000000110, 0b001001001)], 'O')
+        self.assertIsNone(lookup.WINNER[0])
+        self.assertTrue(lookup.IS_FULL[lookup.board_index(0b101010101, 0b010101010)])
+        self.assertFalse(lookup.IS_FULL[lookup.board_index(0b101010101, 0b000101010)])
+
+    def test_threat_features(self):
+        # X on (0, 0) and (0, 1), O on (1, 1)
+        index = lookup.board_index(0b000000011, 0b000010000)
+        self.assertEqual(lookup.WINNING_CELLS[index], (0b000000100, 0))
+        self.assertEqual(lookup.THREATS[index], (1, 0))
+        self.assertEqual(lookup.OPEN_LINES[index], (4, 4))
+        self.assertEqual(lookup.OPEN_ROWS[index], (1, 1))
+
+    def test_empty_board(self):
+        self.assertEqual(lookup.OPEN_LINES[0], (8, 8))
+        self.assertEqual(lookup.OPEN_ROWS[0], (0, 0))
+        self.assertEqual(lookup.THREATS[0], (0, 0))
+
+import rules
+from RL import UltimateTicTacToeRL
+
+class TestRules(unittest.TestCase):
+
+    def setUp(self):
+        # X has won the top-left board
+        self.game_state = [[' '] * 9 for _ in range(9)]
+        for i in range(3):
+            self.game_state[0][i] = 'X'
+        self.game_state[4][4] = 'O'
+
+    def test_engines_agree_on_legal_moves(self):
+        engines = [UltimateTicTacToeAI(), MonteCarloAI(), UltimateTicTacToeRL()]
+        for active_box in [None, (0, 0), (1, 1)]:
+            expected = rules.get_valid_moves(self.game_state, active_box)
+            for engine in engines:
+                self.assertEqual(engine.get_valid_moves(self.game_state, active_box), expected)
+
+    def test_won_board_excluded(self):
+        moves = UltimateTicTacToeRL().get_valid_moves(self.game_state, (0, 0))
+        self.assertEqual(len(moves), 9 * 8 - 1)
+        self.assertFalse(any(i < 3 and j < 3 for i, j in moves))
+
+    def test_cached_moves_follow_the_position(self):
+        moves = rules.get_valid_moves(self.game_state, (1, 1))
+        self.assertNotIn((4, 4), moves)
+        moves.remove((3, 3))
+        rules.apply_move(self.game_state, (3, 3), 'X')
+        self.assertEqual(rules.get_valid_moves(self.game_state, (1, 1)), moves)
+
+    def test_bitstate_moves_updated_incrementally(self):
+        state = BitState.from_grid(self.game_state, (1, 1))
+        for move in [(3, 3), (1, 4), (3, 4)]:
+            state.play(MOVE_TO_INDEX[move])
+            fresh = BitState.from_grid(state.to_grid(), None)
+            fresh.active = state.active
+            self.assertEqual(state.legal_moves(), fresh.legal_moves())
+        for _ in range(3):
+            state.undo()
+        self.assertEqual(rules.get_valid_moves(state, None), rules.get_valid_moves(self.game_state, (1, 1)))
+
+    def test_winner(self):
+        self.assertEqual(rules.check_winner(self.game_state), 'X')
+        self.assertTrue(rules.is_over(self.game_state))
+        self.assertEqual(rules.check_small_board([row[:3] for row in self.game_state[:3]]), 'X')
+
+import json
+import benchmark
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_corpus_positions(self):
+        for entry in benchmark.CORPUS:
+            grid, active_box = benchmark.load_position(entry)
+            state = BitState.from_grid(grid, active_box)
+            self.assertEqual(len(entry['moves']) % 2, 0)  # X to move
+            self.assertIsNone(state.winner())
+            self.assertEqual(state.macro, [0, 0])  # minimax stops at won boards
+            self.assertTrue(state.legal_moves())
+            if entry.get('free_choice'):
+                self.assertIsNone(active_box)
+
+    def test_percentile(self):
+        samples = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(samples, 0.50), 50)
+        self.assertEqual(benchmark.percentile(samples, 0.99), 99)
+        self.assertEqual(benchmark.percentile([3.0], 0.95), 3.0)
+
+    def test_quick_run_is_json(self):
+        results = json.loads(json.dumps(benchmark.run_benchmarks(quick=True, repeat=1)))
+        self.assertEqual(results['corpus_version'], benchmark.CORPUS_VERSION)
+        self.assertGreater(results['minimax']['nodes_per_sec'], 0)
+        self.assertGreater(results['rollouts']['rollouts_per_sec'], 0)
+        for name in ('minimax', 'monte_carlo'):
+            latency = results['latency'][name]
+            self.assertEqual(latency['calls'], len(benchmark.CORPUS))
+            self.assertLessEqual(latency['p50'], latency['p99'])
+            self.assertGreater(latency['peak_memory_bytes'], 0)
+        self.assertFalse(results['startup']['main']['loads_pygame'])
+        self.assertFalse(results['startup']['engines']['loads_pygame'])
+        self.assertTrue(results['startup']['gui']['loads_pygame'])
+
+import perft
+
+class TestPerft(unittest.TestCase):
+
+    def test_empty_board_counts(self):
+        empty = [[' '] * 9 for _ in range(9)]
+        for depth, expected in enumerate(perft.EMPTY_BOARD_COUNTS[:5]):
+            self.assertEqual(perft.perft(empty, depth), expected)
+
+    def test_generators_agree(self):
+        empty = [[' '] * 9 for _ in range(9)]
+        for name, move_generator in perft.generators().items():
+            self.assertEqual(perft.perft(empty, 3, move_generator=move_generator),
+                             perft.EMPTY_BOARD_COUNTS[3], name)
+        self.assertEqual(empty, [[' '] * 9 for _ in range(9)])
+
+    def test_closed_boards_and_game_end(self):
+        # Late in a game, with won and full boards and free choices
+        moves = [(2, 6), (7, 0), (5, 0), (6, 2), (0, 7), (2, 4), (6, 5), (2, 7), (7, 4), (3, 5),
+                 (2, 8), (6, 7), (2, 3), (7, 2), (5, 8), (7, 8), (4, 7), (5, 5), (7, 6), (3, 1),
+                 (0, 4), (2, 5), (7, 7), (3, 3), (0, 0), (0, 1), (1, 3), (5, 1), (8, 3), (7, 1),
+                 (4, 5), (4, 6), (4, 0), (4, 2), (3, 6), (0, 2), (1, 6), (5, 2), (6, 6), (1, 2),
+                 (0, 5), (1, 8), (8, 7), (3, 0), (2, 0), (1, 4), (5, 4), (0, 6)]
+        entry = {'moves': moves}
+        grid, active_box = benchmark.load_position(entry)
+        self.assertEqual(perft.perft(grid, 5, active_box), 3575)
+        for move_generator in perft.generators().values():
+            self.assertEqual(perft.perft(grid, 5, active_box, move_generator=move_generator), 3575)
+
+    def test_divide(self):
+        grid, active_box = benchmark.load_position(benchmark.CORPUS[1])
+        counts = perft.divide(grid, 3, active_box)
+        self.assertEqual(set(counts), set(rules.get_valid_moves(grid, active_box)))
+        self.assertEqual(sum(counts.values()), perft.perft(grid, 3, active_box))
+        self.assertEqual(perft.divide(grid, 3, active_box, move_generator=rules.get_valid_moves), counts)
+
+    def test_won_game_has_no_leaves(self):
+        grid = [[' '] * 9 for _ in range(9)]
+        for i in range(3):
+            for j in range(3):
+                grid[i][j * 3 + i] = 'X'  # X wins the top row of boards
+        self.assertEqual(perft.perft(grid, 2), 0)
+        self.assertEqual(perft.divide(grid, 2), {})
+
+import time
+import tournament
+
+class IllegalMoveAI:
+    """
+    Always plays the top-left cell, legal or not.
+    """
+    def get_best_move(self, game_state, active_box):
+        return (0, 0)
+
+
+class TestTournament(unittest.TestCase):
+
+    def test_parse_engine(self):
+        spec = tournament.parse_engine('monte:iterations=50,exploration=1.0')
+        self.assertEqual(spec, {'name': 'monte:iterations=50,exploration=1.0', 'kind': 'monte',
+                                'options': {'iterations': 50, 'exploration': 1.0}})
+        self.assertEqual(tournament.parse_engine('minimax')['options'], {})
+        with self.assertRaises(ValueError):
+            tournament.parse_engine('alphazero')
+
+    def test_schedule_alternates_colours(self):
+        specs = [tournament.parse_engine(text) for text in ('minimax', 'monte', 'minimax:max_depth=1')]
+        tasks = tournament.schedule(specs, 'round-robin', 4, 2, seed=5)
+        self.assertEqual(len(tasks), 3 * 4)
+        for first, second in zip(tasks[::2], tasks[1::2]):
+            self.assertEqual((first[0], first[1]), (second[1], second[0]))
+            self.assertEqual(first[2], second[2])
+            self.assertEqual(len(first[2]), 2)
+        self.assertEqual(len(tournament.schedule(specs, 'gauntlet', 4, 2, seed=5)), 2 * 4)
+        self.assertEqual(tasks, tournament.schedule(specs, 'round-robin', 4, 2, seed=5))
+
+    def test_elo(self):
+        self.assertAlmostEqual(tournament.elo_difference(0.5), 0)
+        self.assertAlmostEqual(tournament.elo_difference(0.75), 190.85, places=2)
+        elo, low, high = tournament.elo_interval(30, 40, 30)
+        self.assertAlmostEqual(elo, 0)
+        self.assertLess(low, 0)
+        self.assertAlmostEqual(low, -high)
+        self.assertEqual(tournament.elo_interval(4, 0, 0)[:2], (None, None))
+
+    def test_tournament(self):
+        specs = [tournament.parse_engine('minimax:max_depth=1'), tournament.parse_engine('monte:iterations=20')]
+        report = tournament.run_tournament(specs, games=2, plies=2, seed=3)
+        self.assertEqual(report['games'], 2)
+        self.assertEqual(report['forfeits'], 0)
+        pairing, = report['pairings']
+        self.assertEqual(pairing['wins'] + pairing['draws'] + pairing['losses'], 2)
+        for stats in report['engines'].values():
+            self.assertEqual(stats['wins'] + stats['draws'] + stats['losses'], 2)
+            self.assertGreater(stats['moves'], 0)
+            self.assertLessEqual(stats['p50_move_time'], stats['max_move_time'])
+
+    def test_illegal_move_forfeits(self):
+        with patch.dict(tournament.ENGINES, {'illegal': (lambda: IllegalMoveAI(), False)}):
+            spec = tournament.parse_engine('illegal')
+            result = tournament.play_game((tournament.parse_engine('minimax:max_depth=1'), spec, [(0, 0)], 0))
+        self.assertTrue(result['forfeit'])
+        self.assertEqual(result['winner'], 0)
+
+    def test_monte_carlo_time_limit(self):
+        ai = MonteCarloAI(time_limit=0.05, seed=0)
+        start = time.perf_counter()
+        ai.get_best_move([[' '] * 9 for _ in range(9)], None)
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertGreater(ai.root.visits, 0)
+
+from thinking import SearchThread
+
+class TestSearchThread(unittest.TestCase):
+
+    def setUp(self):
+        self.empty = [[' '] * 9 for _ in range(9)]
+
+    def test_result_matches_direct_search(self):
+        expected = UltimateTicTacToeAI(max_depth=3).get_best_move(self.empty, (1, 1))
+        search = SearchThread(UltimateTicTacToeAI(max_depth=3), self.empty, (1, 1)).start()
+        self.assertEqual(search.result(timeout=10), expected)
+        self.assertTrue(search.done())
+
+    def test_cancel_minimax(self):
+        ai = UltimateTicTacToeAI(max_depth=12)
+        search = SearchThread(ai, self.empty, None).start()
+        time.sleep(0.05)
+        self.assertFalse(search.done())
+        start = time.perf_counter()
+        search.cancel(timeout=5)
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertTrue(search.done())
+        self.assertIn(search.best_so_far(), ai.get_valid_moves(self.empty, None))
+        self.assertIsNone(ai.cancel)
+
+    def test_cancel_monte_carlo(self):
+        ai = MonteCarloAI(iterations=10 ** 7, seed=0)
+        search = SearchThread(ai, self.empty, None).start()
+        time.sleep(0.1)
+        search.cancel(timeout=5)
+        self.assertTrue(search.done())
+        self.assertIsNotNone(search.best_so_far())
+        self.assertIn(search.result(), ai.get_valid_moves(self.empty, None))
+
+    def test_error_is_raised(self):
+        search = SearchThread(UltimateTicTacToeAI(), None, None).start()
+        with self.assertRaises(TypeError):
+            search.result(timeout=5)
+
+from thinking import PonderThread
+
+class TestPondering(unittest.TestCase):
+
+    def setUp(self):
+        self.game_state = [[' '] * 9 for _ in range(9)]
+
+    def play(self, game_state, move, player):
+        game_state[move[0]][move[1]] = player
+        return (move[0] % 3, move[1] % 3)
+
+    def test_minimax_answers_pondered_reply_at_once(self):
+        ai = UltimateTicTacToeAI(max_depth=3)
+        active_box = self.play(self.game_state, ai.get_best_move(self.game_state, None), 'X')
+        ponder = PonderThread(ai, deepcopy(self.game_state), active_box).start()
+        time.sleep(0.5)
+        ponder.cancel()
+        reply = ponder.result()
+        self.assertIn(reply, ai.get_valid_moves(self.game_state, active_box))
+        self.assertGreaterEqual(ai.pondered[2], ai.max_depth)
+
+        active_box = self.play(self.game_state, reply, 'O')
+        start = time.perf_counter()
+        move = ai.get_best_move(self.game_state, active_box)
+        self.assertLess(time.perf_counter() - start, 0.05)
+        self.assertEqual(ai.ponder_hits, 1)
+        self.assertEqual(move, ai.pondered[1])
+
+    def test_minimax_ponder_needs_cancel_event(self):
+        with self.assertRaises(ValueError):
+            UltimateTicTacToeAI().ponder(self.game_state, None)
+
+    def test_monte_carlo_reuses_pondered_tree(self):
+        ai = MonteCarloAI(iterations=200, seed=4)
+        active_box = self.play(self.game_state, ai.get_best_move(self.game_state, None), 'X')
+        ai.ponder(self.game_state, active_box, iterations=2000)
+        reply = ai.get_valid_moves(self.game_state, active_box)[0]
+        active_box = self.play(self.game_state, reply, 'O')
+        ai.get_best_move(self.game_state, active_box)
+        self.assertGreater(ai.reused_visits, 0)
+
+    def test_monte_carlo_ponder_cancel(self):
+        ai = MonteCarloAI(iterations=200, seed=4)
+        active_box = self.play(self.game_state, ai.get_best_move(self.game_state, None), 'X')
+        ponder = PonderThread(ai, deepcopy(self.game_state), active_box).start()
+        time.sleep(0.1)
+        ponder.cancel(timeout=5)
+        self.assertTrue(ponder.done())
+        self.assertIsNone(ponder.result())
+
+import tempfile
+import book
+
+class TestOpeningBook(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'test.book')
+        self.empty = [[' '] * 9 for _ in range(9)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_positions_seen_by_side_to_move(self):
+        positions = book.book_positions(1)
+        self.assertEqual(len(positions), 1 + 81)
+        for state in positions.values():
+            self.assertEqual(state.player, 0)
+            # After X's first move the book holds O's view, where X's mark is shown as O
+            self.assertFalse(any(state.masks[0]))
+
+    def test_round_trip(self):
+        entries = book.build_book(plies=1, depth=2)
+        book.write_book(self.path, entries)
+        with book.OpeningBook(self.path) as opening_book:
+            self.assertEqual(len(opening_book), len(entries))
+            for key, move in entries.items():
+                self.assertEqual(opening_book.probe(key), move)
+            self.assertIsNone(opening_book.probe(12345))
+        expected = UltimateTicTacToeAI(max_depth=2).get_best_move(self.empty, None)
+        with book.OpeningBook(self.path) as opening_book:
+            self.assertEqual(UltimateTicTacToeAI(max_depth=2, book=opening_book).get_best_move(self.empty, None),
+                             expected)
+
+    def test_engines_play_book_moves(self):
+        # A book that answers the empty board with the corner cell (8, 8)
+        book.write_book(self.path, {BitState().key: MOVE_TO_INDEX[(8, 8)], 7: 3})
+        with book.OpeningBook(self.path) as opening_book:
+            for ai in (UltimateTicTacToeAI(book=opening_book), MonteCarloAI(iterations=10, book=opening_book)):
+                self.assertEqual(ai.get_best_move(self.empty, None), (8, 8))
+                # Not legal when the move must go to the centre box
+                self.assertNotEqual(ai.get_best_move(self.empty, (1, 1)), (8, 8))
+
+    def test_bad_files(self):
+        self.assertIsNone(book.load_book(self.path))
+        with open(self.path, 'wb') as file:
+            file.write(b'not a book at all, not at all')
+        with self.assertRaises(ValueError):
+            book.OpeningBook(self.path)
+        book.write_book(self.path, {1: 2, 3: 4})
+        with open(self.path, 'r+b') as file:
+            file.truncate(os.path.getsize(self.path) - 1)
+        self.assertIsNone(book.load_book(self.path))
+
+import threading
+from endgame import EndgameSolver
+
+def exact_value(state, ply=0):
+    """
+    Plain negamax to the end of the game, as a reference for the solver.
+    """
+    if state.winner():
+        return ply - 1000
+    if state.closed == 0x1FF:
+        return 0
+    best = -10 ** 6
+    for move in state.legal_moves():
+        state.play(move)
+        best = max(best, -exact_value(state, ply + 1))
+        state.undo()
+    return best
+
+
+class TestEndgameSolver(unittest.TestCase):
+
+    def late_positions(self, empty_cells, count, seed=0):
+        rng = random.Random(seed)
+        solver = EndgameSolver(threshold=empty_cells)
+        positions = []
+        while len(positions) < count:
+            state = BitState()
+            while not state.is_over() and solver.empty_cells(state) > empty_cells:
+                state.play(rng.choice(state.legal_moves()))
+            if not state.is_over():
+                state.history = []
+                positions.append(state)
+        return positions
+
+    def test_matches_full_search(self):
+        solver = EndgameSolver(threshold=9)
+        for state in self.late_positions(9, 15):
+            value = exact_value(state)
+            outcome, distance, move = solver.solve(state)
+            if value > 0:
+                self.assertEqual((outcome, distance), ('win', 1000 - value))
+            elif value < 0:
+                self.assertEqual((outcome, distance), ('loss', 1000 + value))
+            else:
+                self.assertEqual((outcome, distance), ('draw', None))
+            state.play(move)
+            self.assertEqual(-exact_value(state, 1), value)
+
+    def test_threshold_and_node_limit(self):
+        empty = [[' '] * 9 for _ in range(9)]
+        self.assertIsNone(EndgameSolver().solve(empty))
+        state = self.late_positions(16, 1, seed=3)[0]
+        self.assertIsNotNone(EndgameSolver(threshold=16).solve(state))
+        self.assertIsNone(EndgameSolver(threshold=16, node_limit=5).solve(state))
+        self.assertIsNone(EndgameSolver(threshold=8).solve(state))
+
+    def test_cancel_stops_the_solve(self):
+        state = self.late_positions(16, 1, seed=3)[0]
+        cancel = threading.Event()
+        solver = EndgameSolver(threshold=16)
+        self.assertIsNotNone(solver.solve(state, cancel=cancel))
+        self.assertGreater(solver.nodes, 256)
+        cancel.set()
+        solver.new_game()
+        self.assertIsNone(solver.solve(state, cancel=cancel))
+        self.assertEqual(solver.nodes, 256)
+
+    def test_engines_play_proven_moves(self):
+        # The AIs search as X
+        positions = [state for state in self.late_positions(12, 8, seed=1) if state.player == 0]
+        self.assertTrue(positions)
+        for state in positions:
+            move = EndgameSolver(threshold=12).solve(state)[2]
+            grid = state.to_grid()
+            active_box = None if state.active is None else divmod(state.active, 3)
+            for ai in (UltimateTicTacToeAI(endgame=EndgameSolver(threshold=12)),
+                       MonteCarloAI(iterations=10, endgame=EndgameSolver(threshold=12))):
+                self.assertEqual(ai.get_best_move(grid, active_box), INDEX_TO_MOVE[move])
+
+import numpy as np
+from qtable import QTable
+
+class TestQTable(unittest.TestCase):
+
+    def test_reads_do_not_insert(self):
+        table = QTable()
+        self.assertEqual(table.get(1, 5), 0.0)
+        self.assertEqual(list(table.get_many(1, [0, 1])), [0.0, 0.0])
+        self.assertEqual(table.max_value(1), 0.0)
+        self.assertEqual(len(table), 0)
+
+    def test_set_and_add(self):
+        table = QTable()
+        table.set(1, 5, 0.5)
+        table.add(1, 7, -0.25)
+        table.add(1, 5, 0.25)
+        self.assertEqual(table.get(1, 5), 0.75)
+        self.assertEqual(table.get(1, 7), -0.25)
+        self.assertEqual(table.get(1, 8), 0.0)
+        self.assertEqual(list(table.get_many(1, [7, 8, 5])), [-0.25, 0.0, 0.75])
+        self.assertEqual(len(table), 1)
+
+    def test_max_value_counts_unwritten_actions(self):
+        table = QTable()
+        table.set(1, 3, -1.0)
+        self.assertEqual(table.max_value(1), 0.0)
+        self.assertEqual(table.max_value(1, [3]), -1.0)
+        for action in range(81):
+            table.set(1, action, -1.0)
+        self.assertEqual(table.max_value(1), -1.0)
+
+    def test_evicts_least_recently_used(self):
+        table = QTable(max_entries=2)
+        table.set(1, 0, 1.0)
+        table.set(2, 0, 2.0)
+        table.get(1, 0)
+        table.set(3, 0, 3.0)
+        self.assertIn(1, table)
+        self.assertNotIn(2, table)
+        self.assertIn(3, table)
+        self.assertEqual(table.evictions, 1)
+
+    def test_reuses_freed_slots(self):
+        table = QTable(max_entries=1, capacity=4)
+        for key in range(100):
+            table.set(key, 0, 1.0)
+            table.set(key, 1, 2.0)
+        self.assertEqual(table.top, 3)
+        self.assertEqual(table.nbytes(), 4 * 5)
+
+    def test_float16_values(self):
+        table = QTable(dtype=np.float16)
+        table.set(1, 0, 0.1)
+        self.assertEqual(table.values.dtype, np.float16)
+        self.assertAlmostEqual(table.get(1, 0), 0.1, places=3)
+
+    def test_items(self):
+        table = QTable()
+        table.set(9, 4, 1.5)
+        table.set(9, 2, 0.5)
+        [(key, actions, values)] = list(table.items())
+        self.assertEqual(key, 9)
+        self.assertEqual(actions, bytes([4, 2]))
+        self.assertEqual(list(values), [1.5, 0.5])
+
+    def test_rl_agent_learns_into_table(self):
+        agent = UltimateTicTacToeRL(alpha=0.5, gamma=1.0, epsilon=0.0, max_states=10)
+        board = [[' '] * 9 for _ in range(9)]
+        after = [row[:] for row in board]
+        after[0][3] = 'X'
+        final = [row[:] for row in after]
+        final[1][1] = 'O'
+        # (0, 3) is move index 9, and sends the reply to box (0, 0)
+        agent.state_history = [(board, None, (0, 3)), (after, (0, 0), (1, 1)), (final, (1, 1), (3, 3))]
+        agent.update_q_table(1.0)
+        self.assertEqual(agent.q_table.get(agent.state_to_key(after, (0, 0)), 4), 0.5)
+        # The second update reads the first under the same key
+        self.assertEqual(agent.q_table.get(agent.state_to_key(board), 9), 0.25)
+        self.assertEqual(len(agent.q_table), 2)
+        self.assertEqual(agent.choose_action(board, [(1, 0), (0, 3)]), (0, 3))
+        self.assertEqual(agent.choose_action(after, [(0, 0), (1, 1)], (0, 0)), (1, 1))
+
+from qtable import QSnapshot
+
+class TestQTableSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'q.snapshot')
+
+    def filled_table(self, dtype=np.float32):
+        table = QTable(dtype=dtype)
+        rng = random.Random(0)
+        for _ in range(500):
+            table.add(rng.getrandbits(64), rng.randrange(81), rng.random())
+        for key in list(table.index)[:50]:
+            for action in rng.sample(range(81), 10):
+                table.set(key, action, rng.random())
+        return table
+
+    def test_round_trip(self):
+        for dtype in (np.float32, np.float16):
+            table = self.filled_table(dtype)
+            table.save(self.path)
+            with QSnapshot(self.path) as snapshot:
+                self.assertEqual(len(snapshot), len(table))
+                self.assertEqual(snapshot.values.dtype, np.dtype(dtype))
+                resumed = QTable.from_snapshot(snapshot)
+                for key, actions, values in list(table.items()):
+                    self.assertIn(key, snapshot)
+                    self.assertEqual(list(snapshot.get_many(key, list(actions))), list(values.astype(float)))
+                    self.assertEqual(snapshot.max_value(key), table.max_value(key))
+                    self.assertEqual(resumed.get(key, actions[0]), float(values[0]))
+                self.assertNotIn(12345, snapshot)
+                self.assertEqual(snapshot.get(12345, 0), 0.0)
+
+    def test_empty_table(self):
+        QTable().save(self.path)
+        with QSnapshot(self.path) as snapshot:
+            self.assertEqual(len(snapshot), 0)
+            self.assertEqual(snapshot.max_value(1), 0.0)
+            self.assertEqual(len(QTable.from_snapshot(snapshot)), 0)
+
+    def test_resumed_table_keeps_learning(self):
+        table = self.filled_table()
+        table.save(self.path)
+        with QSnapshot(self.path) as snapshot:
+            resumed = QTable.from_snapshot(snapshot, max_entries=100)
+        self.assertEqual(len(resumed), 100)
+        key = next(iter(resumed.index))
+        before = resumed.get(key, 80)
+        resumed.add(key, 80, 1.0)
+        resumed.add(7, 3, 1.0)
+        self.assertEqual(resumed.get(key, 80), before + 1.0)
+        self.assertEqual(resumed.get(7, 3), 1.0)
+        self.assertEqual(len(resumed), 100)
+
+    def test_rejects_bad_files(self):
+        self.filled_table().save(self.path)
+        with open(self.path, 'rb') as file:
+            data = file.read()
+        for broken in (b'', b'NOTATABLE' + data[9:], data[:-1]):
+            with open(self.path, 'wb') as file:
+                file.write(broken)
+            with self.assertRaises(ValueError):
+                QSnapshot(self.path)
+
+    def test_rl_agent_save_and_load(self):
+        agent = UltimateTicTacToeRL(epsilon=0.0)
+        board = [[' '] * 9 for _ in range(9)]
+        agent.q_table.set(agent.state_to_key(board), 40, 1.0)
+        agent.save(self.path)
+        for read_only in (False, True):
+            loaded = UltimateTicTacToeRL(epsilon=0.0)
+            loaded.load(self.path, read_only)
+            self.assertIsInstance(loaded.q_table, QSnapshot if read_only else QTable)
+            self.assertEqual(loaded.choose_action(board, [(0, 0), (4, 4)]), (4, 4))
+
+import train
+
+def agent_view(game):
+    """
+    Returns the (grid, active_box) a player of a self-play game is shown,
+    with the side to move as X.
+    """
+    state = game.state
+    grid = state.to_grid()
+    if state.player == 1:
+        grid = [[tournament.SWAP[cell] for cell in row] for row in grid]
+    return grid, None if state.active is None else divmod(state.active, 3)
+
+class TestSelfPlayTraining(unittest.TestCase):
+
+    def test_keys_match_agent_view(self):
+        agent = UltimateTicTacToeRL()
+        rng = random.Random(4)
+        game = train.SelfPlayGame()
+        while not game.state.is_over():
+            grid, active_box = agent_view(game)
+            self.assertEqual(game.key(), agent.state_to_key(grid, active_box))
+            game.play(rng.choice(game.state.legal_moves()))
+
+    def test_stored_values_drive_choose_action(self):
+        agent = UltimateTicTacToeRL(epsilon=0.0)
+        rng = random.Random(5)
+        game = train.SelfPlayGame()
+        while not game.state.is_over():
+            state = game.state
+            grid, active_box = agent_view(game)
+            move = rng.choice(state.legal_moves())
+            agent.q_table.set(game.key(), move, 1.0)
+            valid_actions = [INDEX_TO_MOVE[index] for index in state.legal_moves()]
+            self.assertEqual(agent.choose_action(grid, valid_actions, active_box), INDEX_TO_MOVE[move])
+            game.play(move)
+
+    def test_trained_values_drive_choose_action(self):
+        # Record every position training plays a move in, as the agent sees it
+        positions = {}
+        play = train.SelfPlayGame.play
+
+        def recording_play(game, index):
+            positions[game.key()] = agent_view(game) + (game.state.legal_moves(),)
+            play(game, index)
+
+        agent = UltimateTicTacToeRL(epsilon=0.0)
+        with patch.object(train.SelfPlayGame, 'play', recording_play):
+            train.train(agent, 100, batch_size=16, epsilon=0.5, alpha=0.5, seed=2)
+        checked = 0
+        for key, (grid, active_box, moves) in positions.items():
+            values = agent.q_table.get_many(key, moves)
+            if len(set(values.tolist())) > 1:
+                pick = agent.choose_action(grid, [INDEX_TO_MOVE[index] for index in moves], active_box)
+                self.assertEqual(values[moves.index(MOVE_TO_INDEX[pick])], values.max())
+                checked += 1
+        self.assertTrue(checked)
+
+    def test_shared_moves_stay_in_target_range(self):
+        # A greedy batch plays the preloaded opening in every game
+        agent = UltimateTicTacToeRL()
+        empty = train.SelfPlayGame().key()
+        agent.q_table.set(empty, 40, 0.1)
+        train.train(agent, 256, batch_size=256, epsilon=0.0, alpha=0.5, seed=0)
+        self.assertGreaterEqual(agent.q_table.get(empty, 40), -agent.gamma)
+        self.assertLessEqual(agent.q_table.get(empty, 40), 1.0)
+
+    def test_schedules(self):
+        schedule = train.parse_schedule('0.5:0.1')
+        self.assertAlmostEqual(schedule(0.0), 0.5)
+        self.assertAlmostEqual(schedule(0.5), 0.3)
+        self.assertAlmostEqual(schedule(2.0), 0.1)
+        self.assertEqual(train.parse_schedule('0.2')(0.7), 0.2)
+
+    def test_plays_every_episode(self):
+        agent = UltimateTicTacToeRL(epsilon=0.2)
+        stats = train.train(agent, 50, batch_size=16, seed=0)
+        self.assertEqual(stats['episodes'], 50)
+        self.assertEqual(stats['wins_x'] + stats['wins_o'] + stats['draws'], 50)
+        self.assertGreater(stats['transitions'], 50 * 17)
+        self.assertGreater(stats['transitions_per_sec'], 0)
+        self.assertGreater(len(agent.q_table), 0)
+        self.assertEqual(train.train(UltimateTicTacToeRL(), 50, batch_size=16, seed=0)['transitions'],
+                         train.train(UltimateTicTacToeRL(), 50, batch_size=16, seed=0)['transitions'])
+
+    def test_learns_winning_moves(self):
+        agent = UltimateTicTacToeRL()
+        train.train(agent, 200, batch_size=32, epsilon=1.0, alpha=0.5, seed=1)
+        winning = [value for _, _, values in agent.q_table.items() for value in values if value > 0.4]
+        self.assertTrue(winning)
+
+    def test_refuses_read_only_table(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'q.snapshot')
+        agent = UltimateTicTacToeRL()
+        agent.save(path)
+        agent.load(path, read_only=True)
+        with self.assertRaises(ValueError):
+            train.train(agent, 1)
+
+import pipeline
+
+class TestActorLearnerPipeline(unittest.TestCase):
+
+    def test_ring_buffer_wraps_and_fills(self):
+        ring = pipeline.RingBuffer(capacity=5)
+        self.assertTrue(ring.push([1, 2, 3], [4, 5, 6], [0.5, -0.5, 1.0]))
+        self.assertEqual(ring.pop(2)['key'].tolist(), [1, 2])
+        self.assertTrue(ring.push([7, 8, 9], [1, 1, 1], [0.0, 0.0, 0.25]))
+        self.assertFalse(ring.push([10, 11], [0, 0], [0.0, 0.0]))
+        self.assertEqual(len(ring), 4)
+        batch = ring.pop(10)
+        self.assertEqual(batch['key'].tolist(), [3, 7, 8, 9])
+        self.assertEqual(batch['action'].tolist(), [6, 1, 1, 1])
+        self.assertEqual(batch['target'].tolist(), [1.0, 0.0, 0.0, 0.25])
+        self.assertEqual(len(ring.pop(10)), 0)
+
+    def test_actors_feed_the_learner(self):
+        agent = UltimateTicTacToeRL()
+        lines = []
+        stats = pipeline.run_pipeline(agent, 30, actors=2, batch_size=8, sync_interval=200,
+                                      ring_size=64, seed=0, report_interval=0, output=lines.append)
+        self.assertEqual(stats['episodes'], 30)
+        self.assertEqual(stats['applied'], stats['transitions'])
+        self.assertGreater(stats['syncs'], 0)
+        self.assertEqual(sum(actor['episodes'] for actor in stats['actors']), 30)
+        self.assertGreater(len(agent.q_table), 0)
+        self.assertTrue(lines)
+        self.assertIn('episodes', lines[-1])
+
+    def test_learned_values_drive_choose_action(self):
+        agent = UltimateTicTacToeRL(epsilon=0.0)
+        # Without syncs every actor plays against the empty table, so its
+        # games can be replayed here from its seed
+        pipeline.run_pipeline(agent, 30, actors=2, batch_size=8, epsilon=0.5, alpha=0.5,
+                              sync_interval=10 ** 9, ring_size=64, seed=0)
+        positions = {}
+        for number in range(2):
+            play = train.SelfPlay(QTable(), 15, 8, agent.gamma, number)
+            while not play.done():
+                for game in play.games:
+                    positions[game.key()] = agent_view(game) + (game.state.legal_moves(),)
+                play.step(0.5)
+        checked = 0
+        for key, (grid, active_box, moves) in positions.items():
+            values = agent.q_table.get_many(key, moves)
+            if len(set(values.tolist())) > 1:
+                pick = agent.choose_action(grid, [INDEX_TO_MOVE[index] for index in moves], active_box)
+                self.assertEqual(values[moves.index(MOVE_TO_INDEX[pick])], values.max())
+                checked += 1
+        self.assertTrue(checked)
+
+    def test_rejects_small_rings(self):
+        with self.assertRaises(ValueError):
+            pipeline.run_pipeline(UltimateTicTacToeRL(), 10, actors=1, batch_size=64, ring_size=100)
+
+import subprocess
+import pygame
+import gui
+from board import BigBoard
+
+class TestBoardView(unittest.TestCase):
+
+    def setUp(self):
+        self.screen = pygame.Surface((gui.SCREEN_WIDTH, gui.SCREEN_HEIGHT + gui.SUBTITLE_HEIGHT))
+        self.view = gui.BoardView(self.screen)
+        self.big_board = BigBoard()
+
+    def test_redraws_only_changes(self):
+        first = self.view.draw(self.big_board, "Hello")
+        self.assertEqual(len(first), 2)
+        self.assertEqual(self.view.draw(self.big_board, "Hello"), [])
+        self.big_board.boards[1][2].make_move(0, 1, 'X')
+        self.assertEqual(self.view.draw(self.big_board, "Hello"),
+                         [pygame.Rect(7 * gui.CELL_SIZE, 3 * gui.CELL_SIZE, gui.CELL_SIZE, gui.CELL_SIZE)])
+        self.assertEqual(self.view.draw(self.big_board, "Bye"),
+                         [pygame.Rect(0, gui.SCREEN_HEIGHT, gui.SCREEN_WIDTH, gui.SUBTITLE_HEIGHT)])
+        self.view.invalidate()
+        self.assertEqual(len(self.view.draw(self.big_board, "Bye")), 2)
+
+    def test_matches_full_redraw(self):
+        self.view.draw(self.big_board, "")
+        self.big_board.boards[0][0].make_move(1, 1, 'X')
+        self.big_board.boards[2][1].make_move(2, 0, 'O')
+        self.view.draw(self.big_board, "")
+        expected = pygame.Surface(self.screen.get_size())
+        gui.draw_board(expected, self.big_board)
+        gui.draw_subtitle(expected, "")
+        self.assertEqual(pygame.image.tobytes(self.screen, 'RGB'), pygame.image.tobytes(expected, 'RGB'))
+
+    def test_glyphs_are_cached(self):
+        self.assertIs(gui.glyph('X'), gui.glyph('X'))
+        self.assertIs(gui.grid_layer(), gui.grid_layer())
+
+    def test_import_leaves_pygame_uninitialized(self):
+        code = ("import gui, pygame; print(pygame.get_init(), pygame.font.get_init()); "
+                "gui.glyph('X'); print(pygame.get_init(), pygame.font.get_init())")
+        process = subprocess.run([sys.executable, '-c', code], cwd=os.path.abspath(os.path.join(os.path.dirname(__file__), '..')),
+                                 env=dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT='1'),
+                                 capture_output=True, text=True, check=True)
+        self.assertEqual(process.stdout.split(), ['False', 'False', 'False', 'True'])
+
+import main
+
+class TestHeadlessStartup(unittest.TestCase):
+
+    @patch('main.play_gui')
+    @patch('main.play_command_line')
+    def test_cli_flag_skips_prompt_and_window(self, play_command_line, play_gui):
+        with patch('builtins.input', side_effect=AssertionError("asked")):
+            main.main(['--cli', '--ai', 'monte'])
+        play_command_line.assert_called_once()
+        self.assertEqual(play_command_line.call_args[0][2], 2)
+        play_gui.assert_not_called()
+
+    @patch('main.play_gui')
+    @patch('main.play_command_line')
+    @patch('builtins.input', return_value='2')
+    def test_prompt_chooses_gui(self, mock_input, play_command_line, play_gui):
+        main.main([])
+        play_gui.assert_called_once()
+        self.assertIsNone(play_gui.call_args[0][2])
+        play_command_line.assert_not_called()
+
+    def test_make_ai(self):
+        self.assertIsInstance(main.make_ai(1, None, None), UltimateTicTacToeAI)
+        self.assertIsInstance(main.make_ai(2, None, None), MonteCarloAI)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,96 @@
+"""
+Background AI search for the GUI and command line loops.
+
+The search runs in a daemon thread so the window keeps handling events and
+redrawing while the AI thinks. Both AIs check their cancel event during the
+search and keep their best root move so far in best_so_far.
+
+PonderThread searches on the human's time instead, and must be cancelled
+before the AI is asked for its next move.
+"""
+import threading
+
+
+class SearchThread:
+    """
+    Runs ai.get_best_move in a background thread with a cancel token.
+    """
+    def __init__(self, ai, game_state, active_box):
+        """
+        Initialize the search of game_state; call start to begin it
+        """
+        self.ai = ai
+        self.game_state = game_state
+        self.active_box = active_box
+        self.cancel_event = threading.Event()
+        self.move = None
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        """
+        Starts the search and returns self.
+        """
+        self.thread.start()
+        return self
+
+    def run(self):
+        """
+        Body of the search thread.
+        """
+        self.ai.cancel = self.cancel_event
+        try:
+            self.move = self.search()
+        except Exception as error:
+            self.error = error
+        finally:
+            self.ai.cancel = None
+
+    def search(self):
+        """
+        Runs the search and returns its move.
+        """
+        return self.ai.get_best_move(self.game_state, self.active_box)
+
+    def done(self):
+        """
+        Checks if the search has finished.
+        """
+        return not self.thread.is_alive()
+
+    def best_so_far(self):
+        """
+        Returns the best move found so far, or None.
+        """
+        return self.ai.best_so_far
+
+    def cancel(self, timeout=None):
+        """
+        Asks the search to stop and waits up to timeout seconds for it.
+        """
+        self.cancel_event.set()
+        self.thread.join(timeout)
+
+    def result(self, timeout=None):
+        """
+        Waits for the search and returns its move, raising any error the
+        search raised.
+        """
+        self.thread.join(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.move
+
+
+class PonderThread(SearchThread):
+    """
+    Runs ai.ponder in a background thread while the human thinks.
+
+    game_state is the position after the AI's move, with the human to move.
+    The result is the reply the AI expects, if the AI makes a guess.
+    """
+    def search(self):
+        """
+        Ponders until cancelled and returns the expected reply.
+        """
+        return self.ai.ponder(self.game_state, self.active_box)
@@ -0,0 +1,287 @@
+"""
+Headless tournaments between engine configurations.
+
+Engines are given as 'kind' or 'kind:option=value,...', for example
+'minimax:max_depth=4' or 'monte:iterations=2000'. Every pairing plays
+seeded random openings twice, once with each engine as X, and the games are
+spread over a process pool. The report gives win/draw/loss counts, the Elo
+difference of every pairing with a 95% confidence interval, and per-move
+time statistics of every engine.
+
+    python tournament.py minimax:max_depth=3 monte --games 20 --time-limit 0.1
+"""
+import argparse
+import ast
+import json
+import math
+import random
+import sys
+import time
+from multiprocessing import Pool
+from benchmark import percentile
+from bitboard import BitState, MOVE_TO_INDEX, INDEX_TO_MOVE
+from minimax import UltimateTicTacToeAI
+from monte import MonteCarloAI
+
+# Engine kinds, and whether they take a seed
+ENGINES = {
+    'minimax': (UltimateTicTacToeAI, False),
+    'monte': (MonteCarloAI, True),
+}
+
+MODES = ('round-robin', 'gauntlet')
+
+SWAP = {' ': ' ', 'X': 'O', 'O': 'X'}
+
+
+def parse_engine(text):
+    """
+    Returns the engine spec dict of a 'kind:option=value,...' string.
+    """
+    kind, _, options_text = text.partition(':')
+    if kind not in ENGINES:
+        raise ValueError(f"Unknown engine {kind!r}, expected one of {', '.join(ENGINES)}")
+    options = {}
+    for item in filter(None, options_text.split(',')):
+        key, _, value = item.partition('=')
+        options[key.strip()] = ast.literal_eval(value.strip())
+    return {'name': text, 'kind': kind, 'options': options}
+
+
+def make_engine(spec, seed):
+    """
+    Builds the engine of a spec, seeding it unless the spec sets a seed.
+    """
+    engine_class, seeded = ENGINES[spec['kind']]
+    options = dict(spec['options'])
+    if seeded:
+        options.setdefault('seed', seed)
+    return engine_class(**options)
+
+
+def random_opening(rng, plies):
+    """
+    Returns plies random legal moves from the empty board.
+    """
+    state = BitState()
+    moves = []
+    for _ in range(plies):
+        move = rng.choice(state.legal_moves())
+        state.play(move)
+        moves.append(INDEX_TO_MOVE[move])
+    return moves
+
+
+def play_game(task):
+    """
+    Plays one game and returns its result.
+
+    task is (spec_x, spec_o, opening, seed). Engines always search as X, so
+    the engine playing O is shown the board with X and O swapped. An engine
+    returning an illegal move or no move loses the game.
+    """
+    spec_x, spec_o, opening, seed = task
+    engines = (make_engine(spec_x, seed), make_engine(spec_o, seed + 1))
+    state = BitState()
+    for move in opening:
+        state.play(MOVE_TO_INDEX[move])
+
+    times = ([], [])
+    winner = None
+    forfeit = False
+    while not state.is_over():
+        player = state.player
+        grid = state.to_grid()
+        if player == 1:
+            grid = [[SWAP[cell] for cell in row] for row in grid]
+        active_box = None if state.active is None else divmod(state.active, 3)
+        start = time.perf_counter()
+        move = engines[player].get_best_move(grid, active_box)
+        times[player].append(time.perf_counter() - start)
+        index = MOVE_TO_INDEX.get(move)
+        if index is None or index not in state.legal_moves():
+            winner = 1 - player
+            forfeit = True
+            break
+        state.play(index)
+    else:
+        winner = None if state.winner() is None else 'XO'.index(state.winner())
+
+    return {
+        'players': (spec_x['name'], spec_o['name']),
+        'winner': winner,
+        'forfeit': forfeit,
+        'moves': len(state.history),
+        'times': times,
+    }
+
+
+def schedule(specs, mode, games, plies, seed):
+    """
+    Returns the game tasks of a tournament.
+
+    games is the number of games per pairing, rounded up to an even number
+    so every opening is played with both colour assignments.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode!r}, expected one of {', '.join(MODES)}")
+    if mode == 'gauntlet':
+        pairings = [(specs[0], other) for other in specs[1:]]
+    else:
+        pairings = [(a, b) for i, a in enumerate(specs) for b in specs[i + 1:]]
+
+    rng = random.Random(seed)
+    openings = [random_opening(rng, plies) for _ in range((games + 1) // 2)]
+    tasks = []
+    for a, b in pairings:
+        for opening in openings:
+            tasks.append((a, b, opening, seed + 2 * len(tasks)))
+            tasks.append((b, a, opening, seed + 2 * len(tasks)))
+    return tasks
+
+
+def elo_difference(score):
+    """
+    Returns the Elo difference that expects score, or None for 0 and 1.
+    """
+    if score <= 0 or score >= 1:
+        return None
+    return -400 * math.log10(1 / score - 1)
+
+
+def elo_interval(wins, draws, losses, z=1.96):
+    """
+    Returns the Elo difference of a win/draw/loss record and the bounds of
+    its confidence interval, from the normal approximation of the score.
+    Differences that are unbounded are None.
+    """
+    games = wins + draws + losses
+    if not games:
+        return None, None, None
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = z * math.sqrt(variance / games)
+    return elo_difference(score), elo_difference(score - margin), elo_difference(score + margin)
+
+
+def summarize(specs, results):
+    """
+    Returns the tournament report as a dict.
+    """
+    names = [spec['name'] for spec in specs]
+    records = {name: [0, 0, 0] for name in names}
+    times = {name: [] for name in names}
+    pairings = {}
+    for result in results:
+        for side, name in enumerate(result['players']):
+            times[name].extend(result['times'][side])
+            if result['winner'] is None:
+                records[name][1] += 1
+            else:
+                records[name][0 if result['winner'] == side else 2] += 1
+
+        first, second = sorted(result['players'], key=names.index)
+        record = pairings.setdefault((first, second), [0, 0, 0])
+        if result['winner'] is None:
+            record[1] += 1
+        else:
+            record[0 if result['players'][result['winner']] == first else 2] += 1
+
+    report = {'engines': {}, 'pairings': [], 'games': len(results),
+              'forfeits': sum(result['forfeit'] for result in results)}
+    for name in names:
+        wins, draws, losses = records[name]
+        samples = times[name]
+        report['engines'][name] = {
+            'wins': wins, 'draws': draws, 'losses': losses,
+            'moves': len(samples),
+            'mean_move_time': sum(samples) / len(samples) if samples else None,
+            'p50_move_time': percentile(samples, 0.50) if samples else None,
+            'p95_move_time': percentile(samples, 0.95) if samples else None,
+            'max_move_time': max(samples) if samples else None,
+        }
+    for (first, second), (wins, draws, losses) in pairings.items():
+        elo, low, high = elo_interval(wins, draws, losses)
+        report['pairings'].append({
+            'engine': first, 'opponent': second,
+            'wins': wins, 'draws': draws, 'losses': losses,
+            'elo': elo, 'elo_low': low, 'elo_high': high,
+        })
+    return report
+
+
+def run_tournament(specs, mode='round-robin', games=10, plies=2, seed=0, workers=1):
+    """
+    Plays a tournament between engine specs and returns its report.
+
+    With more than one worker the games are played in a process pool.
+    """
+    names = [spec['name'] for spec in specs]
+    if len(set(names)) != len(names):
+        raise ValueError("Engine names must be unique")
+    if len(specs) < 2:
+        raise ValueError("A tournament needs at least two engines")
+    tasks = schedule(specs, mode, games, plies, seed)
+    if workers > 1:
+        with Pool(workers) as pool:
+            results = pool.map(play_game, tasks)
+    else:
+        results = [play_game(task) for task in tasks]
+    report = summarize(specs, results)
+    report.update({'mode': mode, 'opening_plies': plies, 'seed': seed})
+    return report
+
+
+def format_elo(value, unbounded='inf'):
+    """
+    Formats an Elo difference, showing unbounded for None.
+    """
+    return unbounded if value is None else f"{value:+.0f}"
+
+
+def print_report(report):
+    """
+    Prints the tournament report as tables.
+    """
+    print(f"{report['games']} games, {report['forfeits']} forfeits")
+    print(f"{'engine':30} {'W':>4} {'D':>4} {'L':>4} {'moves':>6} {'mean s':>8} {'p95 s':>8} {'max s':>8}")
+    for name, stats in report['engines'].items():
+        columns = [stats[key] or 0.0 for key in ('mean_move_time', 'p95_move_time', 'max_move_time')]
+        print(f"{name:30} {stats['wins']:4} {stats['draws']:4} {stats['losses']:4} {stats['moves']:6} "
+              + ' '.join(f"{value:8.3f}" for value in columns))
+    print()
+    for pairing in report['pairings']:
+        print(f"{pairing['engine']} vs {pairing['opponent']}: "
+              f"+{pairing['wins']} ={pairing['draws']} -{pairing['losses']}, "
+              f"Elo {format_elo(pairing['elo'], '?')} "
+              f"[{format_elo(pairing['elo_low'], '-inf')}, {format_elo(pairing['elo_high'], '+inf')}]")
+
+
+def main(argv=None):
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Play a tournament between engine configurations.")
+    parser.add_argument('engines', nargs='+', help="engine specs such as minimax:max_depth=3 or monte")
+    parser.add_argument('--mode', choices=MODES, default='round-robin')
+    parser.add_argument('--games', type=int, default=10, help='games per pairing')
+    parser.add_argument('--plies', type=int, default=2, help='random opening moves')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1, help='processes playing games')
+    parser.add_argument('--time-limit', type=float, help='seconds per move for every engine')
+    parser.add_argument('--output', help='write the report as JSON to this file')
+    args = parser.parse_args(argv)
+
+    specs = [parse_engine(text) for text in args.engines]
+    if args.time_limit is not None:
+        for spec in specs:
+            spec['options'].setdefault('time_limit', args.time_limit)
+    report = run_tournament(specs, args.mode, args.games, args.plies, args.seed, args.workers)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,249 @@
+"""
+Batched self-play training for UltimateTicTacToeRL.
+
+Both sides of every game share the agent's Q-table. A state is keyed the
+way the agent sees it when it plays: the Zobrist key of the position with
+the side to move as X, as as_state(grid, active_box, 'X') would compute it.
+Each game keeps that key for both players and updates them with every
+move, so no board is ever converted or rehashed.
+
+batch_size games are stepped together, one ply at a time. After every ply
+the Q-values of the moves played are updated with the negamax TD
+target: 1 for a winning move, 0 for a drawing move, and otherwise gamma
+times minus the best Q-value of the opponent in the next position. Those
+opponent values are the ones read to choose the opponent's move, so every
+ply reads each state once. Each update is applied to the value in the
+table at that point, since the games of a batch often play the same move.
+
+    python train.py --episodes 20000 --batch 256 --epsilon 0.3:0.05 --output q.snapshot
+"""
+import argparse
+import random
+import sys
+import time
+from functools import partial
+import numpy as np
+from bitboard import BitState, ZOBRIST_ACTIVE, ZOBRIST_CELLS
+from qtable import QSnapshot
+from RL import UltimateTicTacToeRL
+
+
+class SelfPlayGame:
+    """
+    A game with the Q-table key of the position for each player.
+
+    views[p] is the key of the position seen by player p as X, with X to
+    move. pending is the last move of the side that just moved as
+    (key, action), waiting for the next position's values.
+    """
+    __slots__ = ('state', 'views', 'pending')
+
+    def __init__(self):
+        """
+        Initialize an empty board
+        """
+        self.state = BitState()
+        self.views = [ZOBRIST_ACTIVE[9], ZOBRIST_ACTIVE[9]]
+        self.pending = None
+
+    def key(self):
+        """
+        Returns the key of the position for the side to move.
+        """
+        return self.views[self.state.player]
+
+    def play(self, index):
+        """
+        Plays a move for the side to move and updates both keys.
+        """
+        state = self.state
+        player = state.player
+        before = state.active
+        state.play(index)
+        active = (ZOBRIST_ACTIVE[9 if before is None else before]
+                  ^ ZOBRIST_ACTIVE[9 if state.active is None else state.active])
+        self.views[player] ^= ZOBRIST_CELLS[0][index] ^ active
+        self.views[1 - player] ^= ZOBRIST_CELLS[1][index] ^ active
+
+
+def linear_schedule(start, end=None):
+    """
+    Returns a schedule going from start to end over the training run, as a
+    function of the fraction of episodes done. Without end it is constant.
+    """
+    return partial(interpolate, start, start if end is None else end)
+
+
+def interpolate(start, end, fraction):
+    """
+    Returns the value a fraction of the way from start to end.
+    """
+    return start + (end - start) * min(max(fraction, 0.0), 1.0)
+
+
+def parse_schedule(text):
+    """
+    Returns the schedule of a 'start' or 'start:end' string.
+    """
+    start, _, end = text.partition(':')
+    return linear_schedule(float(start), float(end) if end else None)
+
+
+class SelfPlay:
+    """
+    Batched self-play games reading their moves from a Q-table.
+
+    Up to batch_size games are in progress at once, and finished games are
+    replaced until episodes games have been started. table may be a QTable
+    or a QSnapshot and can be swapped between steps.
+    """
+    def __init__(self, table, episodes, batch_size=64, gamma=0.9, seed=None):
+        """
+        Initialize the first batch of games
+        """
+        self.table = table
+        self.episodes = episodes
+        self.gamma = gamma
+        self.rng = random.Random(seed)
+        self.started = min(batch_size, episodes)
+        self.games = [SelfPlayGame() for _ in range(self.started)]
+        self.stats = {'episodes': 0, 'transitions': 0, 'wins_x': 0, 'wins_o': 0, 'draws': 0}
+
+    def done(self):
+        """
+        Checks if every game has finished.
+        """
+        return not self.games
+
+    def step(self, epsilon):
+        """
+        Plays one move in every game, exploring with probability epsilon.
+
+        Returns (keys, actions, targets) of the moves that have a TD target
+        now, with targets a float array.
+        """
+        table = self.table
+        rng = self.rng
+        stats = self.stats
+        keys, actions, targets = [], [], []
+        following = []
+        for game in self.games:
+            state = game.state
+            key = game.key()
+            moves = state.legal_moves()
+            q_values = table.get_many(key, moves).tolist()
+            best_value = max(q_values)
+            if game.pending is not None:
+                # The opponent's last move led here
+                keys.append(game.pending[0])
+                actions.append(game.pending[1])
+                targets.append(-self.gamma * best_value)
+
+            if rng.random() < epsilon:
+                choice = rng.randrange(len(moves))
+            else:
+                best = [i for i, value in enumerate(q_values) if value == best_value]
+                choice = best[0] if len(best) == 1 else best[rng.randrange(len(best))]
+            move = moves[choice]
+            game.play(move)
+
+            if state.is_over():
+                winner = state.winner()
+                keys.append(key)
+                actions.append(move)
+                targets.append(0.0 if winner is None else 1.0)
+                stats['episodes'] += 1
+                stats['draws' if winner is None else 'wins_' + winner.lower()] += 1
+                if self.started < self.episodes:
+                    self.started += 1
+                    following.append(SelfPlayGame())
+            else:
+                game.pending = (key, move)
+                following.append(game)
+        self.games = following
+        stats['transitions'] += len(keys)
+        return keys, actions, np.array(targets)
+
+
+def train(agent, episodes, batch_size=64, epsilon=None, alpha=None, seed=None, progress=None):
+    """
+    Trains agent by self-play and returns throughput and result statistics.
+
+    epsilon and alpha are numbers or schedules taking the fraction of
+    episodes done; they default to the agent's own values. progress, if
+    given, is called with the statistics so far whenever games finish.
+    """
+    if not callable(epsilon):
+        epsilon = linear_schedule(agent.epsilon if epsilon is None else epsilon)
+    if not callable(alpha):
+        alpha = linear_schedule(agent.alpha if alpha is None else alpha)
+    if isinstance(agent.q_table, QSnapshot):
+        raise ValueError("Cannot train a read-only Q-table")
+    table = agent.q_table
+    play = SelfPlay(table, episodes, batch_size, agent.gamma, seed)
+    start = time.perf_counter()
+    while not play.done():
+        fraction = play.stats['episodes'] / episodes
+        finished = play.stats['episodes']
+        keys, actions, targets = play.step(epsilon(fraction))
+
+        # TD update of every move that has a target, against the value in the
+        # table now: games of a batch often share a move, and each of them
+        # must see the others' updates
+        rate = alpha(fraction)
+        for key, action, target in zip(keys, actions, targets.tolist()):
+            table.add(key, action, rate * (target - table.get(key, action)))
+
+        if progress is not None and play.stats['episodes'] > finished:
+            progress(throughput(play.stats, time.perf_counter() - start))
+    return throughput(play.stats, time.perf_counter() - start)
+
+
+def throughput(stats, seconds):
+    """
+    Returns stats with the elapsed time and the rates per second.
+    """
+    rates = dict(stats, seconds=seconds)
+    rates['episodes_per_sec'] = stats['episodes'] / seconds if seconds > 0 else 0.0
+    rates['transitions_per_sec'] = stats['transitions'] / seconds if seconds > 0 else 0.0
+    return rates
+
+
+def main(argv=None):
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Train the Q-learning agent by batched self-play.")
+    parser.add_argument('--episodes', type=int, default=10000)
+    parser.add_argument('--batch', type=int, default=256, help='games stepped together')
+    parser.add_argument('--epsilon', type=parse_schedule, default='0.3:0.05', help="'start' or 'start:end'")
+    parser.add_argument('--alpha', type=parse_schedule, default='0.5:0.1', help="'start' or 'start:end'")
+    parser.add_argument('--gamma', type=float, default=0.9)
+    parser.add_argument('--max-states', type=int, default=1_000_000, help='states kept in the Q-table')
+    parser.add_argument('--float16', action='store_true', help='store Q-values as float16')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--resume', help='snapshot to continue training from')
+    parser.add_argument('--output', help='snapshot file to write')
+    args = parser.parse_args(argv)
+
+    agent = UltimateTicTacToeRL(gamma=args.gamma, max_states=args.max_states,
+                                dtype=np.float16 if args.float16 else np.float32)
+    if args.resume:
+        agent.load(args.resume)
+
+    def progress(stats):
+        print(f"\r{stats['episodes']}/{args.episodes} episodes, "
+              f"{stats['episodes_per_sec']:.0f} episodes/s, "
+              f"{stats['transitions_per_sec']:.0f} transitions/s", end='', flush=True)
+
+    stats = train(agent, args.episodes, args.batch, args.epsilon, args.alpha, args.seed, progress)
+    print(f"\n{stats['episodes']} episodes ({stats['wins_x']} X wins, {stats['wins_o']} O wins, "
+          f"{stats['draws']} draws), {stats['transitions']} transitions in {stats['seconds']:.1f} s; "
+          f"{len(agent.q_table)} states stored")
+    if args.output:
+        agent.save(args.output)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,77 @@
+"""
+Fixed-size transposition table for the alpha-beta search.
+
+Entries are indexed by the low bits of a BitState Zobrist key and keep the
+full key to detect collisions.
+"""
+
+# Bound types of a stored value
+EXACT, LOWER, UPPER = 0, 1, 2
+
+REPLACEMENT_POLICIES = ('always', 'depth')
+
+
+class TranspositionTable:
+    """
+    Stores (key, depth, bound, value, best_move, generation) entries.
+
+    With the 'always' policy a new entry overwrites its slot. With the
+    'depth' policy it only replaces an entry of the same position, an entry
+    from an earlier search, or one searched to a smaller depth.
+    """
+    def __init__(self, size=1 << 18, replacement='depth'):
+        """
+        Initialize an empty table with size rounded up to a power of two
+        """
+        if replacement not in REPLACEMENT_POLICIES:
+            raise ValueError(f"Unknown replacement policy {replacement!r}")
+        self.size = 1 << max(size - 1, 0).bit_length()
+        self.mask = self.size - 1
+        self.replacement = replacement
+        self.entries = [None] * self.size
+        self.generation = 0
+        self.hits = 0
+        self.stores = 0
+
+    def new_search(self):
+        """
+        Marks the entries stored so far as belonging to an earlier search.
+        """
+        self.generation += 1
+
+    def clear(self):
+        """
+        Removes every entry, for example at the start of a new game.
+        """
+        self.entries = [None] * self.size
+        self.generation = 0
+        self.hits = 0
+        self.stores = 0
+
+    def probe(self, key):
+        """
+        Returns the entry stored for key, or None.
+        """
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key, depth, bound, value, best_move):
+        """
+        Stores a search result, subject to the replacement policy.
+        """
+        slot = key & self.mask
+        old = self.entries[slot]
+        if (self.replacement == 'depth' and old is not None and old[0] != key
+                and old[5] == self.generation and old[1] > depth):
+            return
+        self.entries[slot] = (key, depth, bound, value, best_move, self.generation)
+        self.stores += 1
+
+    def __len__(self):
+        """
+        Returns the number of occupied slots.
+        """
+        return sum(entry is not None for entry in self.entries)